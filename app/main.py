@@ -1,15 +1,58 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
-from app.models.dto import ResearcherInput, FormData, SurveyQueryRequest, SurveyData # Importing DTOs from dto.py
-from app.models.form_generator import analyze_researcher_input  # Importing form generation 
-from app.models.survey_report import run_analysis  # Importing the survey report
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, PlainTextResponse
+from app.models.dto import ResearcherInput, ResearcherInputBatch, FormData, SurveyQueryRequest, SurveyData, ResponseBatch, RespondentAnswers # Importing DTOs from dto.py
+from app.models.form_generator import generate_research_form_cached, stream_research_form  # Importing form generation
+from app.models.report_store import report_store, report_cache_key, content_report_key
+from app.models.report_formats import REPORT_MEDIA_TYPES
+from app.models.job_queue import report_jobs, QueueFullError
+from app.models.survey_store import close_survey_store, survey_content_hash
 import uvicorn
+import asyncio
+import hashlib
+import importlib
 import json
 import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
-from app.models.form_bot import initialize_llm_chain, process_survey_data
+from pydantic import ValidationError
+from app.models.llm_client import close_client
+from app.models.metrics import http_request_seconds, render_prometheus, server_timing_header, start_request_trace
+from app.models.settings import settings
 
-app = FastAPI()
+# Heavy modules (docx, matplotlib, wordcloud, numpy, langchain) are only imported by the
+# endpoints that need them, so workers serving form generation start fast and small
+SURVEY_REPORT_MODULE = "app.models.survey_report"
+FORM_BOT_MODULE = "app.models.form_bot"
+CHART_RENDERER_MODULE = "app.models.chart_renderer"
+AGGREGATE_STORE_MODULE = "app.models.aggregate_store"
+
+_loaded_modules = {}
+
+async def load_module(name: str):
+    module = _loaded_modules.get(name)
+    if module is None:
+        # First use: import off the event loop so other requests keep being served. A
+        # concurrent first use blocks on the import lock in its own thread rather than
+        # seeing the partially initialized module in sys.modules.
+        module = await asyncio.to_thread(importlib.import_module, name)
+        _loaded_modules[name] = module
+    return module
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The pooled OpenAI HTTP client, chart render pool and report workers live for the app's lifetime
+    yield
+    await report_jobs.stop()
+    await close_client()
+    close_survey_store()
+    chart_renderer = sys.modules.get(CHART_RENDERER_MODULE)
+    if chart_renderer is not None:
+        chart_renderer.shutdown_render_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,76 +60,447 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-# Endpoint for generating a research form based on researcher input
-@app.post("/generate_research_form")
-async def generate_research_form(researcher_input: ResearcherInput):
-    """
-    API endpoint to generate a research form based on researcher input.
-    """
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    spans = start_request_trace()
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Route templates keep label cardinality bounded (e.g. /survey_report_jobs/{job_id})
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    http_request_seconds.observe(time.perf_counter() - start, request.method, path, str(response.status_code))
+    # Streaming responses return here once headers are ready, so only earlier spans are included
+    if settings.metrics_timing_header or request.headers.get("x-timing") == "1":
+        response.headers["Server-Timing"] = server_timing_header(spans)
+    return response
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+async def research_form_result(researcher_input: ResearcherInput):
     # Extracting values from the validated ResearcherInput
     goal = researcher_input.goal
     hypothesis = researcher_input.hypothesis
     target_group = researcher_input.target_group
     time_taken = researcher_input.time_taken
 
-    # Generate the research form using the provided researcher input
-    research_form = analyze_researcher_input(goal, hypothesis, target_group, time_taken)
+    # Generate the research form (or reuse a cached one) from the provided researcher input
+    research_form, cache_hit = await generate_research_form_cached(goal, hypothesis, target_group, time_taken)
 
     if research_form:
         try:
             # Parse the research form string into a JSON object
             research_form_json = json.loads(research_form)
-            return {"research_form": research_form_json} 
+            return {"research_form": research_form_json, "cache": "hit" if cache_hit else "miss"}
         except Exception as e:  # Catch any exception that occurs
             print(f"An error occurred: {e}")
             return {"error": f"An error occurred: {e}"}
     else:
         return {"error": "Failed to generate research form."}
 
+# Endpoint for generating a research form based on researcher input
+@app.post("/generate_research_form")
+async def generate_research_form(researcher_input: ResearcherInput):
+    """
+    API endpoint to generate a research form based on researcher input.
+    """
+    return await research_form_result(researcher_input)
+
+def validate_form_batch(batch: ResearcherInputBatch):
+    if len(batch.inputs) > settings.form_batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {settings.form_batch_max_items} inputs."
+        )
+
+async def indexed_research_form_result(index: int, researcher_input: ResearcherInput):
+    # One failing item is reported in its own result instead of aborting the batch
+    try:
+        result = await research_form_result(researcher_input)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        result = {"error": f"An error occurred: {e}"}
+    return {"index": index, **result}
+
+# Batch endpoint: forms for many researcher inputs, generated concurrently under the
+# shared rate limit and token budget, returned in input order
+@app.post("/generate_research_form/batch")
+async def generate_research_form_batch(batch: ResearcherInputBatch):
+    validate_form_batch(batch)
+    results = await asyncio.gather(
+        *(indexed_research_form_result(i, researcher_input) for i, researcher_input in enumerate(batch.inputs))
+    )
+    return {"results": results}
+
+# Streaming variant: one NDJSON line per input as soon as its form is ready (any order,
+# each line carries its input index)
+@app.post("/generate_research_form/batch/stream")
+async def generate_research_form_batch_stream(batch: ResearcherInputBatch):
+    validate_form_batch(batch)
+
+    async def ndjson_lines():
+        tasks = [
+            asyncio.ensure_future(indexed_research_form_result(i, researcher_input))
+            for i, researcher_input in enumerate(batch.inputs)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            # Stop outstanding generations if the client disconnects
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+# ?format=docx (default), json, html or csv
+ReportFormat = Query("docx", alias="format")
+
+def validate_report_format(output_format: str):
+    if output_format not in REPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported report format '{output_format}'; use one of: {', '.join(REPORT_MEDIA_TYPES)}."
+        )
+
+def report_file_response(report_filename: str, cache_hit: bool = None):
+    # The stored artifact's extension is its format
+    output_format = os.path.splitext(report_filename)[1].lstrip(".")
+    headers = {} if cache_hit is None else {"X-Report-Cache": "hit" if cache_hit else "miss"}
+    return FileResponse(
+        report_filename,
+        media_type=REPORT_MEDIA_TYPES[output_format],
+        filename=f"survey_analysis_report.{output_format}",
+        headers=headers
+    )
+
+def validate_survey_form(survey_data: FormData):
+    # Check if the form is not AI-generated and validate required fields
+    if not survey_data.isGenerated:
+        if not survey_data.goal or not survey_data.hypothesis or not survey_data.targetGroup or not survey_data.timeTaken:
+            raise HTTPException(
+                status_code=400,
+                detail="Required fields (goal, hypothesis, targetGroup, timeTaken) are missing for non-AI-generated form."
+            )
+
+async def build_survey_report(survey_data: FormData, progress=None, output_format="docx"):
+    # Reports are stored under a hash of the canonicalized survey data, so unchanged
+    # surveys are served from the store and concurrent requests never share a file
+    # The pipeline reads the validated model directly, without re-serializing it
+    survey_report = await load_module(SURVEY_REPORT_MODULE)
+    # Hashing serializes the whole survey; keep it off the event loop
+    report_key = await asyncio.to_thread(report_cache_key, survey_data)
+    return await report_store.get_or_create(
+        report_key,
+        lambda output_path, filename: survey_report.run_analysis(survey_data, output_path, filename, progress, output_format),
+        ext=f".{output_format}"
+    )
+
+async def get_stored_form(form_id: str):
+    # Uploaded surveys live in one registry, as form aggregates that responses are added to
+    aggregates = await load_module(AGGREGATE_STORE_MODULE)
+    form = await aggregates.aggregate_store.get(form_id)
+    if form is None:
+        raise HTTPException(status_code=404, detail=f"Survey '{form_id}' not found; upload it with PUT /surveys/{form_id}.")
+    return form
+
+async def build_stored_survey_report(form_id: str, progress=None, output_format="docx"):
+    # Keyed by form state, so the report is rebuilt once new responses arrive
+    form = await get_stored_form(form_id)
+    survey_report = await load_module(SURVEY_REPORT_MODULE)
+    return await report_store.get_or_create(
+        content_report_key(form.cache_key()),
+        lambda output_path, filename: survey_report.run_form_analysis(form, output_path, filename, progress, output_format),
+        ext=f".{output_format}"
+    )
+
+def require_survey_source(survey_data, form_id):
+    if survey_data is None and not form_id:
+        raise HTTPException(status_code=400, detail="Provide the survey data or the form_id of an uploaded survey.")
+
+# Streaming variant: one complete question object per NDJSON line as the form is generated
+@app.post("/generate_research_form/stream")
+async def generate_research_form_stream(researcher_input: ResearcherInput):
+    goal = researcher_input.goal
+    hypothesis = researcher_input.hypothesis
+    target_group = researcher_input.target_group
+    time_taken = researcher_input.time_taken
+    # One cache lookup decides both what is streamed and the header
+    questions, cache_hit = await stream_research_form(goal, hypothesis, target_group, time_taken)
+
+    async def ndjson_lines():
+        try:
+            async for question in questions:
+                yield json.dumps(question) + "\n"
+        except Exception as e:  # Headers are already sent, so report the error in-band
+            print(f"An error occurred: {e}")
+            yield json.dumps({"error": f"An error occurred: {e}"}) + "\n"
+
+    return StreamingResponse(
+        ndjson_lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Form-Cache": "hit" if cache_hit else "miss"}
+    )
 
 # Endpoint survey report
 @app.post("/generate_survey_report")
-async def generate_survey_report(survey_data: FormData):
+async def generate_survey_report(survey_data: Optional[FormData] = None, form_id: Optional[str] = None, output_format: str = ReportFormat):
     try:
-        # Check if the form is not AI-generated and validate required fields
-        if not survey_data.isGenerated:
-            if not survey_data.goal or not survey_data.hypothesis or not survey_data.targetGroup or not survey_data.timeTaken:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Required fields (goal, hypothesis, targetGroup, timeTaken) are missing for non-AI-generated form."
-                )
+        require_survey_source(survey_data, form_id)
+        validate_report_format(output_format)
+        if survey_data is not None:
+            validate_survey_form(survey_data)
+            report_filename, cache_hit = await build_survey_report(survey_data, output_format=output_format)
+        else:
+            # Uploaded surveys were validated when stored
+            report_filename, cache_hit = await build_stored_survey_report(form_id, output_format=output_format)
+        if not report_filename:
+            raise HTTPException(status_code=500, detail="Failed to generate survey report.")
         
-        output_path = "./output"
-        if not os.path.exists(output_path):
-            os.makedirs(output_path)
-        
-        json_data = survey_data.json()
-        report_filename = run_analysis(json_data, output_path)
-        
-        return FileResponse(
-            report_filename,
-            media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            filename="survey_analysis_report.docx"
-        )
+        return report_file_response(report_filename, cache_hit)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating survey report: {str(e)}")
 
+# Asynchronous report jobs: submit, poll status, download
+@app.post("/survey_report_jobs", status_code=202)
+async def submit_survey_report_job(survey_data: Optional[FormData] = None, form_id: Optional[str] = None, output_format: str = ReportFormat):
+    require_survey_source(survey_data, form_id)
+    validate_report_format(output_format)
+    if survey_data is not None:
+        validate_survey_form(survey_data)
+    else:
+        await get_stored_form(form_id)  # 404 now rather than a failed job later
+
+    async def run(job):
+        if survey_data is not None:
+            report_filename, _ = await build_survey_report(survey_data, progress=job.start_stage, output_format=output_format)
+        else:
+            report_filename, _ = await build_stored_survey_report(form_id, progress=job.start_stage, output_format=output_format)
+        return report_filename
+
+    try:
+        job = report_jobs.submit(run)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/survey_report_jobs/{job.id}",
+        "download_url": f"/survey_report_jobs/{job.id}/download",
+    }
+
+@app.get("/survey_report_jobs/{job_id}")
+async def get_survey_report_job(job_id: str):
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+@app.get("/survey_report_jobs/{job_id}/download")
+async def download_survey_report_job(job_id: str):
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Error generating survey report: {job.error}")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}.")
+    if not os.path.exists(job.result):
+        # The artifact was evicted from the store; the client should resubmit
+        raise HTTPException(status_code=410, detail="Report is no longer available.")
+    return report_file_response(job.result)
+
+async def survey_question_source(form_bot, request: SurveyQueryRequest):
+    """
+    Resolves the survey a question is about. Returns its version key (for the answer cache)
+    and a coroutine function building the retrieval context, which only runs on a miss.
+    """
+    require_survey_source(request.survey_data, request.form_id)
+    # Only the top-ranked chunks that fit the token budget go into the prompt
+    if request.survey_data is not None:
+        # Hashing, aggregation and indexing a large survey are CPU-bound; keep them off the loop
+        async def build_inline_context():
+            return await asyncio.to_thread(form_bot.build_survey_context, request.survey_data, request.query)
+
+        return await asyncio.to_thread(survey_content_hash, request.survey_data), build_inline_context
+
+    form = await get_stored_form(request.form_id)
+
+    async def build_stored_context():
+        context = await asyncio.to_thread(form_bot.build_form_context, form, request.query)
+        if context is None:
+            raise HTTPException(status_code=409, detail="Survey changed while answering; please retry.")
+        return context
+
+    # Keyed by form state, so answers are recomputed once new responses arrive
+    return form.cache_key(), build_stored_context
+
+def answer_response(answer: str, cache_hit: bool):
+    return JSONResponse(content={"response": answer}, headers={"X-Answer-Cache": "hit" if cache_hit else "miss"})
+
 @app.post("/ask_survey_question")
 async def ask_survey_question(request: SurveyQueryRequest):
     try:
-        chunks = process_survey_data(request.survey_data)
-        llm_chain = initialize_llm_chain()
-        response = llm_chain.invoke({
-            "data": "\n".join(chunks),
-            "query": request.query
-        })
-        return JSONResponse(content={"response": response.content })
+        form_bot = await load_module(FORM_BOT_MODULE)
+        survey_key, build_context = await survey_question_source(form_bot, request)
+        # Repeated questions about the same survey version are answered from the cache
+        answer, cache_hit = await form_bot.cached_answer(survey_key, request.query, build_context)
+        return answer_response(answer, cache_hit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Streaming variant: the answer is sent as server-sent-event token deltas
+@app.post("/ask_survey_question/stream")
+async def ask_survey_question_stream(request: SurveyQueryRequest):
+    try:
+        form_bot = await load_module(FORM_BOT_MODULE)
+        survey_key, build_context = await survey_question_source(form_bot, request)
+        answer_key = form_bot.answer_cache_key(survey_key, request.query)
+        cached = form_bot.lookup_answer(answer_key)
+        # A cached answer is sent as a single delta
+        context = await build_context() if cached is None else None
+        llm_chain = form_bot.initialize_llm_chain()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def events():
+        try:
+            if cached is not None:
+                yield f"data: {json.dumps({'delta': cached})}\n\n"
+            else:
+                async for delta in form_bot.stream_and_cache_answer(answer_key, llm_chain, context, request.query):
+                    yield f"data: {json.dumps({'delta': delta})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:  # Headers are already sent, so report the error in-band
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Answer-Cache": "miss" if cached is None else "hit",
+        }
+    )
+
+# Survey store: upload a survey once, then reference it by form _id from chat and reports,
+# and send only new responses afterwards. Every /surveys route and form_id lookup reads the
+# same persisted form aggregate.
+def form_status(form) -> dict:
+    return {"form_id": form.form_id, "version": form.version, "respondents": form.respondent_count}
+
+@app.put("/surveys/{form_id}")
+async def put_survey(form_id: str, survey_data: FormData):
+    validate_survey_form(survey_data)
+    aggregates = await load_module(AGGREGATE_STORE_MODULE)
+    return form_status(await aggregates.aggregate_store.initialize(form_id, survey_data))
+
+@app.get("/surveys/{form_id}")
+async def get_survey(form_id: str):
+    return form_status(await get_stored_form(form_id))
+
+@app.delete("/surveys/{form_id}", status_code=204)
+async def delete_survey(form_id: str):
+    aggregates = await load_module(AGGREGATE_STORE_MODULE)
+    if not await aggregates.aggregate_store.delete(form_id):
+        raise HTTPException(status_code=404, detail=f"Survey '{form_id}' not found.")
+
+async def iter_ndjson_lines(chunks, max_line_bytes: int):
+    """
+    Splits a byte stream into (line number, line) pairs, skipping blank lines, without
+    buffering more than one line.
+    """
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+        if len(buffer) > max_line_bytes:
+            raise HTTPException(status_code=413, detail=f"Line {number + 1} exceeds {max_line_bytes} bytes.")
+    if buffer.strip():
+        yield number + 1, buffer
+
+# Streaming upload for surveys too large to send as one JSON document. The first NDJSON line
+# is the FormData (answers may be omitted); every further line is one respondent,
+# {"answers": {"<question _id or index>": [values]}}. Lines are validated one by one and
+# folded into the aggregate in batches, so memory stays bounded by the batch size.
+@app.put("/surveys/{form_id}/ndjson")
+async def put_survey_ndjson(form_id: str, request: Request):
+    aggregates = await load_module(AGGREGATE_STORE_MODULE)
+    form = None
+    batch = []
+    content_hash = hashlib.sha256()
+
+    async def apply_batch():
+        await asyncio.to_thread(form.append_respondents, batch)
+        batch.clear()
+
+    async for number, line in iter_ndjson_lines(request.stream(), settings.upload_max_line_bytes):
+        content_hash.update(line.strip() + b"\n")
+        try:
+            if form is None:
+                survey_data = FormData.model_validate_json(line)
+                validate_survey_form(survey_data)
+                form = await asyncio.to_thread(aggregates.FormAggregate.from_survey, form_id, survey_data)
+                continue
+            answers = RespondentAnswers.model_validate_json(line).answers
+        except ValidationError as e:
+            raise HTTPException(
+                status_code=422,
+                detail={"line": number, "errors": e.errors(include_url=False, include_context=False, include_input=False)}
+            )
+        try:
+            for key in answers:
+                form.resolve(key)
+        except KeyError as e:  # Unknown question
+            raise HTTPException(status_code=400, detail=f"Line {number}: {e.args[0]}")
+        batch.append(answers)
+        if len(batch) >= settings.upload_batch_rows:
+            await apply_batch()
+
+    if form is None:
+        raise HTTPException(status_code=400, detail="The upload is empty; the first line must be the FormData.")
+    if batch:
+        await apply_batch()
+    # An unchanged re-upload keeps the stored state, and with it its reports
+    form.content_hash = content_hash.hexdigest()
+    # Only a complete upload replaces the stored survey
+    return form_status(await aggregates.aggregate_store.put(form))
+
+@app.post("/surveys/{form_id}/responses")
+async def append_survey_responses(form_id: str, batch: ResponseBatch):
+    aggregates = await load_module(AGGREGATE_STORE_MODULE)
+    try:
+        return await aggregates.aggregate_store.append(form_id, batch.answers)
+    except KeyError as e:  # Unknown question; nothing was applied
+        raise HTTPException(status_code=400, detail=str(e.args[0]))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/surveys/{form_id}/aggregate")
+async def get_survey_aggregate(form_id: str):
+    # Stored forms are never modified in place, so they are read without locking
+    form = await get_stored_form(form_id)
+    return await asyncio.to_thread(form.summary)
+
 # Run the FastAPI application
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,291 @@
+import asyncio
+import time
+import uuid
+from collections import Counter
+from itertools import chain
+
+import numpy as np
+
+from app.models.aggregation import (
+    QuestionAggregate, SurveyAggregate, closed_distribution, question_fields, survey_fields, survey_questions,
+)
+from app.models.settings import settings
+from app.models.report_formats import SURVEY_FIELDS, question_stats
+from app.models.result_cache import make_cache_key
+from app.models.survey_store import get_survey_store, survey_content_hash
+from app.models.text_analytics import TermCounter, prune_counter
+
+
+class IncrementalQuestion:
+    """
+    Running counts for one question, updated with work proportional to each new batch.
+    """
+
+    def __init__(self, index: int, question_id: str, question: str, question_type: str):
+        self.index = index
+        self.id = question_id
+        self.question = question
+        self.question_type = question_type.lower()
+        self.rows = 0  # Answer rows (respondents) seen
+        self.answered = 0  # Rows with at least one value
+        self.value_counts = Counter()
+        self.terms = TermCounter(max_terms=settings.aggregate_max_terms)
+
+    @staticmethod
+    def batch_counts(answers) -> tuple:
+        """
+        Counts a batch of answer rows (one list of values per respondent).
+
+        Returns:
+            tuple: (rows, answered, value counts, term counts) of the batch alone.
+        """
+        value_counts = Counter(chain.from_iterable(answers))
+        terms = TermCounter(max_terms=settings.aggregate_max_terms)
+        for value, count in value_counts.items():
+            terms.add(value, count)
+        return len(answers), sum(1 for answer in answers if answer), value_counts, terms.counts
+
+    def merge(self, counts: tuple):
+        """
+        Folds batch counts (see `batch_counts`) into the running counts.
+        """
+        rows, answered, value_counts, term_counts = counts
+        self.rows += rows
+        self.answered += answered
+        self.value_counts.update(value_counts)
+        prune_counter(self.value_counts, settings.aggregate_max_distinct_values)
+        self.terms.counts.update(term_counts)
+        prune_counter(self.terms.counts, settings.aggregate_max_terms)
+
+    def counts(self) -> tuple:
+        return self.rows, self.answered, self.value_counts, self.terms.counts
+
+    def snapshot(self) -> QuestionAggregate:
+        values = list(self.value_counts)
+        value_counts = np.fromiter(self.value_counts.values(), dtype=np.int64, count=len(values))
+        kind, labels, value_to_option = closed_distribution(values, self.question_type)
+        aggregate = QuestionAggregate(
+            index=self.index,
+            question=self.question,
+            question_type=self.question_type,
+            kind=kind,
+            answers=None,
+            values=values,
+            value_counts=value_counts,
+            codes=None,
+            respondents=None,
+            answered=self.answered,
+        )
+        if kind == "open":
+            aggregate.term_counts = dict(self.terms.counts)
+        else:
+            aggregate.labels = labels
+            aggregate.counts = np.bincount(value_to_option, weights=value_counts, minlength=len(labels)).astype(np.int64)
+        return aggregate
+
+
+class FormAggregate:
+    """
+    Per-form aggregate state: survey metadata plus running counts for every question.
+    """
+
+    def __init__(self, form_id: str, survey: dict, questions: list):
+        """
+        Args:
+            form_id (str): The form `_id`.
+            survey (dict): Report metadata (SURVEY_FIELDS), kept alongside the counts so
+                reports can be built without the answers.
+            questions (list): (id, question text, question type) of every question.
+        """
+        self.form_id = form_id
+        self.survey = survey
+        self.questions = [IncrementalQuestion(i, *question) for i, question in enumerate(questions)]
+        self._by_key = {}
+        for q in self.questions:
+            self._by_key[str(q.index)] = q
+            if q.id:
+                self._by_key[q.id] = q
+        self.version = 0  # Bumped on every update
+        self.revision = uuid.uuid4().hex
+        # Hash of the upload this state was built from, while no responses have been added
+        # since; it lets an unchanged re-upload keep its revision (and its reports)
+        self.content_hash = None
+        self.updated_at = time.time()
+
+    @classmethod
+    def from_survey(cls, form_id: str, survey_data, content_hash: str = None):
+        """
+        Builds a form's aggregate from a FormData payload, including the answers it carries.
+        """
+        questions = survey_questions(survey_data)
+        form = cls(form_id, survey_fields(survey_data, SURVEY_FIELDS), [question_fields(q)[:3] for q in questions])
+        form.append({str(i): question_fields(q)[3] for i, q in enumerate(questions)})
+        form.content_hash = content_hash
+        return form
+
+    def schema(self) -> dict:
+        """
+        The form without its counts: survey metadata and questions, as stored by the survey store.
+        """
+        return {"survey": self.survey, "questions": [(q.id, q.question, q.question_type) for q in self.questions]}
+
+    @classmethod
+    def from_schema(cls, form_id: str, schema: dict):
+        return cls(form_id, schema["survey"], schema["questions"])
+
+    @classmethod
+    def restore(cls, record: dict):
+        """
+        Rebuilds a form from a survey store record (see `SurveyStore.load_form`).
+        """
+        form = cls.from_schema(record["form_id"], record["schema"])
+        for q in form.questions:
+            q.rows, q.answered = record["questions"].get(q.index, (0, 0))
+            q.value_counts = Counter(record["values"].get(q.index, {}))
+            q.terms.counts = Counter(record["terms"].get(q.index, {}))
+        form.version = record["version"]
+        form.revision = record["revision"]
+        form.content_hash = record["content_hash"]
+        form.updated_at = record["updated_at"]
+        return form
+
+    def resolve(self, key: str) -> IncrementalQuestion:
+        question = self._by_key.get(key)
+        if question is None:
+            raise KeyError(f"Unknown question '{key}'.")
+        return question
+
+    def batch_counts(self, answers_by_question: dict) -> dict:
+        """
+        Counts a batch of new answers without applying it.
+
+        Args:
+            answers_by_question (dict): Maps a question `_id` (or its index as a string) to
+                new answer rows, one list of values per respondent.
+
+        Returns:
+            dict: Question index -> (rows, answered, value counts, term counts).
+
+        Raises:
+            KeyError: If the batch references an unknown question.
+        """
+        # Resolve every key first so a bad batch changes nothing
+        columns = {}
+        for key, answers in answers_by_question.items():
+            columns.setdefault(self.resolve(key).index, []).extend(answers)
+        return {index: IncrementalQuestion.batch_counts(answers) for index, answers in columns.items()}
+
+    def append(self, answers_by_question: dict):
+        """
+        Adds a batch of new answers; see `batch_counts`.
+        """
+        for index, counts in self.batch_counts(answers_by_question).items():
+            self.questions[index].merge(counts)
+        self.version += 1
+        # A fresh revision for every state: versions restart when a form is uploaded again,
+        # so they cannot tell two states apart
+        self.revision = uuid.uuid4().hex
+        self.content_hash = None
+        self.updated_at = time.time()
+
+    def append_respondents(self, respondents: list):
+        """
+        Adds whole respondents, each a dict mapping question keys to that respondent's
+        values. Questions a respondent skipped get an empty row.
+        """
+        columns = {q.index: [] for q in self.questions}
+        for answers in respondents:
+            row = {self.resolve(key).index: values for key, values in answers.items()}
+            for index, rows in columns.items():
+                rows.append(row.get(index, []))
+        self.append({str(index): rows for index, rows in columns.items()})
+
+    def cache_key(self) -> str:
+        """
+        Key for artifacts derived from the form's current state (retrieval indexes, reports,
+        chat answers); it changes with every update and every changed upload.
+        """
+        return make_cache_key("aggregate", self.form_id, self.revision)
+
+    def counts(self) -> dict:
+        """
+        Question index -> (rows, answered, value counts, term counts).
+        """
+        return {q.index: q.counts() for q in self.questions}
+
+    @property
+    def respondent_count(self) -> int:
+        return max((q.rows for q in self.questions), default=0)
+
+    def snapshot(self) -> SurveyAggregate:
+        return SurveyAggregate(
+            questions=[q.snapshot() for q in self.questions],
+            respondent_count=self.respondent_count,
+        )
+
+    def summary(self, top_term_count: int = 20) -> dict:
+        aggregate = self.snapshot()
+        return {
+            "form_id": self.form_id,
+            "version": self.version,
+            "respondents": aggregate.respondent_count,
+            "questions": [question_stats(q, aggregate, top_term_count) for q in aggregate.questions],
+        }
+
+
+class AggregateStore:
+    """
+    Per-form aggregates keyed by form `_id`, persisted in the survey store's database so
+    they survive restarts and are shared by every worker process. Nothing is evicted; this
+    is the one registry behind the /surveys/{form_id} endpoints and form_id lookups.
+
+    Counts are stored per question and value, so appending responses only writes the counts
+    the batch changes. A form returned by `get` is never modified afterwards, so it can be
+    snapshotted without locking.
+    """
+
+    async def get(self, form_id: str):
+        return await asyncio.to_thread(get_survey_store().load_form, form_id, FormAggregate.restore)
+
+    async def put(self, form: FormAggregate) -> FormAggregate:
+        """
+        Stores a form, unless it is an unchanged re-upload of the stored state. Returns the
+        stored form.
+        """
+        if await asyncio.to_thread(get_survey_store().put_form, form):
+            return form
+        return await self.get(form.form_id) or form
+
+    async def initialize(self, form_id: str, survey_data) -> FormAggregate:
+        """
+        Creates (or replaces) a form's aggregate from a full FormData payload.
+        """
+        form = await asyncio.to_thread(
+            lambda: FormAggregate.from_survey(form_id, survey_data, content_hash=survey_content_hash(survey_data))
+        )
+        return await self.put(form)
+
+    async def delete(self, form_id: str) -> bool:
+        return await asyncio.to_thread(get_survey_store().delete, form_id)
+
+    async def append(self, form_id: str, answers_by_question: dict) -> dict:
+        """
+        Folds a batch of new answers into an existing form's aggregate.
+
+        Returns:
+            dict: The form's new status (form_id, version, respondents).
+
+        Raises:
+            LookupError: If the form has no aggregate yet.
+            KeyError: If the batch references an unknown question.
+        """
+        status = await asyncio.to_thread(
+            get_survey_store().update_form, form_id,
+            lambda schema: FormAggregate.from_schema(form_id, schema).batch_counts(answers_by_question),
+        )
+        if status is None:
+            raise LookupError(f"No aggregate for form '{form_id}'.")
+        return status
+
+
+aggregate_store = AggregateStore()
@@ -0,0 +1,205 @@
+from dataclasses import dataclass, field
+from itertools import chain
+
+import numpy as np
+
+# Display labels for the two-valued question kinds, in chart order
+BINARY_KINDS = {
+    "yes_no": {"yes": "Yes", "no": "No"},
+    "true_false": {"true": "True", "false": "False"},
+}
+
+
+@dataclass
+class QuestionAggregate:
+    """
+    Columnar view of one question's answers.
+
+    `values` holds each distinct raw answer string once; `codes` indexes into it per answer
+    value and `respondents` gives the respondent row each value came from. For closed-ended
+    kinds, `labels`/`counts` hold the option distribution and `first_codes` the option
+    chosen by each respondent (-1 when unanswered), which is what cross-tabs are built on.
+
+    Aggregates restored from incremental counts (see aggregate_store) have no per-answer
+    data: `answers`, `codes`, `respondents` and `first_codes` are None. `term_counts` holds
+    open-ended term frequencies, precomputed by the aggregate store or filled in on first
+    use by text_analytics.
+    """
+    index: int
+    question: str
+    question_type: str
+    kind: str  # 'yes_no', 'true_false', 'mcq' or 'open'
+    answers: list  # The raw answer lists, kept by reference (None for incremental aggregates)
+    values: list
+    value_counts: np.ndarray
+    codes: np.ndarray
+    respondents: np.ndarray
+    answered: int
+    labels: list = field(default_factory=list)
+    counts: np.ndarray = None
+    first_codes: np.ndarray = None
+    term_counts: dict = None
+
+    @property
+    def is_closed(self) -> bool:
+        return self.kind != "open"
+
+    def distribution(self) -> dict:
+        return dict(zip(self.labels, self.counts.tolist())) if self.is_closed else {}
+
+
+@dataclass
+class SurveyAggregate:
+    questions: list
+    respondent_count: int
+    _crosstabs: dict = field(default_factory=dict, repr=False)
+
+    def closed_questions(self):
+        return [q for q in self.questions if q.is_closed]
+
+    def response_rate(self, question: QuestionAggregate) -> float:
+        return question.answered / self.respondent_count if self.respondent_count else 0.0
+
+    def crosstab(self, a: int, b: int) -> np.ndarray:
+        """
+        Counts respondents by (option of question `a`, option of question `b`).
+
+        Args:
+            a (int): Index of the first closed-ended question.
+            b (int): Index of the second closed-ended question.
+
+        Returns:
+            np.ndarray: Matrix of shape (len(labels_a), len(labels_b)).
+        """
+        if (a, b) not in self._crosstabs:
+            qa, qb = self.questions[a], self.questions[b]
+            if not (qa.is_closed and qb.is_closed):
+                raise ValueError("Cross-tabs are only defined for closed-ended questions.")
+            if qa.first_codes is None or qb.first_codes is None:
+                raise ValueError("Cross-tabs need per-respondent answers.")
+            size = min(len(qa.first_codes), len(qb.first_codes))
+            ca, cb = qa.first_codes[:size], qb.first_codes[:size]
+            mask = (ca >= 0) & (cb >= 0)
+            na, nb = len(qa.labels), len(qb.labels)
+            flat = np.bincount(ca[mask] * nb + cb[mask], minlength=na * nb)
+            self._crosstabs[(a, b)] = flat.reshape(na, nb)
+        return self._crosstabs[(a, b)]
+
+
+def _classify(lowered_values, question_type):
+    distinct = set(lowered_values)
+    if distinct:
+        for kind, labels in BINARY_KINDS.items():
+            if distinct <= labels.keys():
+                return kind
+    if question_type == "mcq":
+        return "mcq"
+    return "open"
+
+
+def survey_questions(survey):
+    """
+    The questions of a survey given as a validated FormData model or as its dict form
+    (e.g. loaded from the survey store); models are read in place, without a JSON round trip.
+    """
+    return survey['questions'] if isinstance(survey, dict) else survey.questions
+
+
+def question_fields(question) -> tuple:
+    """
+    Returns (id, question text, question type, answers) of a Question model or dict.
+    """
+    if isinstance(question, dict):
+        return question.get('id'), question['question'], question.get('questionType', ''), question.get('answers') or []
+    return question.id, question.question, question.questionType or '', question.answers or []
+
+
+def survey_fields(survey, names) -> dict:
+    if isinstance(survey, dict):
+        return {name: survey.get(name) for name in names}
+    return {name: getattr(survey, name, None) for name in names}
+
+
+def closed_distribution(values, question_type):
+    """
+    Classifies a question from its distinct raw values and maps them onto option codes.
+
+    Returns:
+        tuple: (kind, labels, value_to_option) where `value_to_option[i]` is the option code
+        of `values[i]`; labels and the mapping are empty for open-ended questions.
+    """
+    lowered = [value.lower() for value in values]
+    kind = _classify(lowered, question_type)
+    if kind == "open":
+        return kind, [], np.zeros(0, dtype=np.int32)
+
+    # Map raw values onto (case-insensitive) option codes
+    if kind in BINARY_KINDS:
+        option_index = {key: i for i, key in enumerate(BINARY_KINDS[kind])}
+        labels = list(BINARY_KINDS[kind].values())
+    else:
+        option_index = {}
+        for value in lowered:
+            option_index.setdefault(value, len(option_index))
+        labels = list(option_index)
+    value_to_option = np.array([option_index[value] for value in lowered], dtype=np.int32)
+    return kind, labels, value_to_option
+
+
+def aggregate_question(index: int, question) -> QuestionAggregate:
+    _, text, question_type, answers = question_fields(question)
+    lengths = np.fromiter(map(len, answers), dtype=np.int64, count=len(answers))
+    flat = list(chain.from_iterable(answers))
+
+    # Intern each distinct answer string once; every answer value becomes a small int code
+    vocab = {}
+    codes = np.fromiter(
+        (vocab.setdefault(value, len(vocab)) for value in flat), dtype=np.int32, count=len(flat)
+    )
+    values = list(vocab)
+    value_counts = np.bincount(codes, minlength=len(values))
+    respondents = np.repeat(np.arange(len(answers), dtype=np.int32), lengths)
+
+    question_type = question_type.lower()
+    kind, labels, value_to_option = closed_distribution(values, question_type)
+
+    aggregate = QuestionAggregate(
+        index=index,
+        question=text,
+        question_type=question_type,
+        kind=kind,
+        answers=answers,
+        values=values,
+        value_counts=value_counts,
+        codes=codes,
+        respondents=respondents,
+        answered=int(np.count_nonzero(lengths)),
+    )
+    if kind == "open":
+        return aggregate
+
+    option_codes = value_to_option[codes] if len(codes) else codes
+    first_codes = np.full(len(answers), -1, dtype=np.int32)
+    # Reversed so that, for repeated respondents, the first value written last wins
+    first_codes[respondents[::-1]] = option_codes[::-1]
+
+    aggregate.labels = labels
+    aggregate.counts = np.bincount(option_codes, minlength=len(labels))
+    aggregate.first_codes = first_codes
+    return aggregate
+
+
+def aggregate_survey(survey_data) -> SurveyAggregate:
+    """
+    Builds the columnar aggregate for a survey in a single pass over its answers.
+
+    Args:
+        survey_data (FormData or dict): The validated survey, or its dict form.
+
+    Returns:
+        SurveyAggregate: Per-question distributions shared by the chart, word-cloud and GPT stages.
+    """
+    questions = [aggregate_question(i, q) for i, q in enumerate(survey_questions(survey_data))]
+    respondent_count = max((len(q.answers) for q in questions), default=0)
+    return SurveyAggregate(questions=questions, respondent_count=respondent_count)
+
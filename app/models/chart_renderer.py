@@ -0,0 +1,114 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from wordcloud import WordCloud
+from app.models.settings import settings
+
+# Render profile: lower DPI / scale trades chart quality for speed
+CHART_DPI = settings.report_chart_dpi
+CHART_SCALE = settings.report_chart_scale
+RENDER_WORKERS = settings.report_render_workers
+# Below this many charts the process pool costs more than it saves
+PARALLEL_THRESHOLD = settings.report_render_parallel_threshold
+
+_executor = None
+_executor_lock = threading.Lock()  # Report workers may ask for the pool concurrently
+
+
+def render_profile():
+    return {"dpi": CHART_DPI, "scale": CHART_SCALE}
+
+
+def _to_png(fig, dpi):
+    FigureCanvasAgg(fig)
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    return buffer.getvalue()
+
+
+def render_chart(spec):
+    """
+    Renders one closed-ended question chart to PNG bytes with the object-oriented Agg API.
+
+    Args:
+        spec (dict): Chart spec with `question`, `type` ('yes_no', 'true_false' or 'mcq'),
+            `labels`, `counts` and the render `profile`.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    profile = spec["profile"]
+    scale = profile["scale"]
+    colors = colormaps["Paired"].colors
+
+    if spec["type"] in ("yes_no", "true_false"):
+        # Pie chart for Yes/No and True/False questions
+        fig = Figure(figsize=(6 * scale, 6 * scale))
+        ax = fig.add_subplot()
+        ax.pie(spec["counts"], labels=spec["labels"], autopct='%1.1f%%', startangle=90, colors=colors)
+        ax.set_title(f"Response Distribution - {spec['question']}")
+    else:
+        # Bar chart for MCQ questions
+        fig = Figure(figsize=(8 * scale, 6 * scale))
+        ax = fig.add_subplot()
+        ax.bar(spec["labels"], spec["counts"], color=colors)
+        ax.set_title(f"Response Distribution - {spec['question']}")
+        ax.set_xlabel("Options")
+        ax.set_ylabel("Count")
+        ax.tick_params(axis="x", labelrotation=45)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment("right")
+        fig.tight_layout()
+
+    return _to_png(fig, profile["dpi"])
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned workers don't inherit the server's threads or event loop
+            _executor = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def render_charts(specs):
+    """
+    Renders chart specs to PNG bytes, in parallel when there are enough of them.
+
+    Returns:
+        list[bytes]: PNG images in the same order as `specs`.
+    """
+    if len(specs) < PARALLEL_THRESHOLD or RENDER_WORKERS <= 1:
+        return [render_chart(spec) for spec in specs]
+    return list(_get_executor().map(render_chart, specs))
+
+
+def render_wordcloud(frequencies, profile=None):
+    """
+    Renders a word cloud from word frequencies to PNG bytes.
+    """
+    profile = profile or render_profile()
+    scale = profile["scale"]
+    wordcloud = WordCloud(
+        width=int(800 * scale), height=int(400 * scale), background_color='white'
+    ).generate_from_frequencies(frequencies)
+    buffer = BytesIO()
+    wordcloud.to_image().save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def shutdown_render_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
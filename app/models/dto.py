@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Union, Dict, Any
 
 class ResearcherInput(BaseModel):
@@ -11,6 +11,13 @@ class ResearcherInput(BaseModel):
     time_taken: int
 
 
+class ResearcherInputBatch(BaseModel):
+    """
+    Several researcher inputs (e.g. one per study cohort) to generate forms for at once.
+    """
+    inputs: List[ResearcherInput]
+
+
 class SurveyResponse(BaseModel):
     """
     Represents a single survey response from a user.
@@ -33,11 +40,11 @@ class Question(BaseModel):
     questionType: str
     options: List[str]
     isRequired: bool
-    _id: str
+    id: Optional[str] = Field(default=None, alias="_id")  # Leading underscores are private in pydantic, so alias it
     answers: Optional[List[List[str]]] = None
 
 class FormData(BaseModel):
-    _id: str
+    id: Optional[str] = Field(default=None, alias="_id")
     title: str
     questions: List[Question]
     summary: Optional[str] = None
@@ -56,7 +63,7 @@ class ChatRequest(BaseModel):
     query: str
 
 class ChatSurveyData(BaseModel):
-    _id: str
+    id: Optional[str] = Field(default=None, alias="_id")
     title: str
     questions: List[Question]
     summary: Optional[str] = None
@@ -71,5 +78,18 @@ class ChatSurveyData(BaseModel):
     timeTaken: Optional[str] = None
 
 class SurveyQueryRequest(BaseModel):
-    survey_data: ChatSurveyData
-    query: str
\ No newline at end of file
+    survey_data: Optional[ChatSurveyData] = None
+    form_id: Optional[str] = None  # A survey uploaded to the survey store, instead of survey_data
+    query: str
+
+class ResponseBatch(BaseModel):
+    """
+    New answers for a form, keyed by question _id (or question index as a string).
+    """
+    answers: Dict[str, List[List[str]]]  # One list of values per new respondent
+
+class RespondentAnswers(BaseModel):
+    """
+    One respondent in an NDJSON survey upload, keyed by question _id (or index as a string).
+    """
+    answers: Dict[str, List[str]]
\ No newline at end of file
@@ -1,20 +1,32 @@
-import openai
+import re
+
 from langchain_openai import ChatOpenAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from dotenv import load_dotenv  # For loading the API key from environment variables
-import os
+from app.models.aggregation import aggregate_survey
 from app.models.dto import SurveyData
+from app.models.llm_client import OPENAI_API_KEY, OPENAI_BASE_URL, REQUEST_TIMEOUT, get_http_client, with_retries, stream_with_retries
+from app.models.metrics import chat_answers, span
+from app.models.prompt_encoding import encode_survey_chunks
+from app.models.result_cache import ResultCache, make_cache_key
+from app.models.retrieval import BM25Index, estimate_tokens
+from app.models.settings import settings
+from app.models.survey_store import get_survey_store, survey_content_hash
 
-# Load OpenAI API key from .env
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+CHUNK_SIZE = settings.chat_chunk_size
+CONTEXT_TOKEN_BUDGET = settings.chat_context_token_budget  # Prompt tokens spent on survey data
+CONTEXT_TOP_K = settings.chat_context_top_k
 
-# Step 1: Load Data from JSON File
-def initialize_llm_chain():
-    llm = ChatOpenAI(temperature=0.7, model="gpt-4")
-    prompt_template = """
+# Per-survey retrieval indexes keyed by form _id and content hash, reused by follow-up questions
+index_cache = ResultCache(
+    max_entries=settings.chat_index_cache_size,
+    ttl=settings.chat_index_cache_ttl,
+)
+
+CHAT_MODEL = "gpt-4"
+CHAT_TEMPERATURE = 0.7
+
+CHAT_PROMPT_TEMPLATE = """
     You are an intelligent assistant helping analyze survey data. Use this data:
     {data}
     
@@ -25,15 +37,186 @@ def initialize_llm_chain():
     2. Be concise and specific
     3. If data is missing, state that clearly
     """
-    prompt = PromptTemplate(input_variables=["data", "query"], template=prompt_template)
-    # New chain using RunnableSequence (pipe operator)
-    return prompt | llm
+CHAT_PROMPT = PromptTemplate(input_variables=["data", "query"], template=CHAT_PROMPT_TEMPLATE)
+
+# Answers keyed by survey version and normalized question; a changed survey gets a new key
+answer_cache = ResultCache(
+    max_entries=settings.chat_answer_cache_size,
+    ttl=settings.chat_answer_cache_ttl,
+)
+_ANSWER_CONFIG_KEY = make_cache_key(CHAT_MODEL, CHAT_TEMPERATURE, CHAT_PROMPT_TEMPLATE, CHUNK_SIZE, CONTEXT_TOKEN_BUDGET, CONTEXT_TOP_K)
+
+_llm_chain = None
+_llm_chain_client = None
+
+
+def initialize_llm_chain():
+    """
+    Returns the chat chain shared by all requests. It is rebuilt only when the pooled HTTP
+    client it is bound to has been replaced (e.g. after an app restart in-process).
+    """
+    global _llm_chain, _llm_chain_client
+    http_client = get_http_client()
+    if _llm_chain is None or _llm_chain_client is not http_client:
+        # Share the app-wide connection pool; retries and concurrency are handled by `with_retries`
+        llm = ChatOpenAI(
+            temperature=CHAT_TEMPERATURE,
+            model=CHAT_MODEL,
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            http_async_client=http_client,
+            timeout=REQUEST_TIMEOUT,
+            max_retries=0,
+        )
+        # New chain using RunnableSequence (pipe operator)
+        _llm_chain = CHAT_PROMPT | llm
+        _llm_chain_client = http_client
+    return _llm_chain
+
+
+def process_aggregate(aggregate):
+    """
+    Chunks a survey for retrieval using the shared prompt encoding: option-count tables for
+    closed-ended questions and deduplicated, counted answers for open-ended ones. Every
+    chunk keeps its question header.
+    """
+    return encode_survey_chunks(aggregate, CHUNK_SIZE // 4)
 
 
 def process_survey_data(survey_data: SurveyData):
-    responses_str = "\n".join(
-        [f"Q: {q.question}\nA: {', '.join(a[0] for a in q.answers)}" 
-         for q in survey_data.questions]
+    return process_aggregate(aggregate_survey(survey_data))
+
+
+def get_survey_index(survey_data: SurveyData) -> BM25Index:
+    """
+    Returns the retrieval index for a survey, building and caching it on first use.
+    """
+    key = make_cache_key(survey_data.id, survey_content_hash(survey_data))
+    index = index_cache.get(key)
+    if index is None:
+        index = BM25Index(process_survey_data(survey_data))
+        index_cache.set(key, index)
+    return index
+
+
+def build_form_context(form, query: str) -> str:
+    """
+    Like `build_survey_context`, for a survey uploaded to the survey store. The retrieval
+    index is persisted alongside the form and rebuilt only after new responses arrive, so
+    follow-up questions only score the query. Stored forms are never modified in place, so
+    the index key and the snapshot belong to the same version.
+
+    Returns:
+        str (or None): The context, or None if the form was updated or deleted meanwhile.
+    """
+    with span("chat.retrieval"):
+        index = get_survey_store().artifact(
+            form.form_id, form.revision, f"chat_index:{CHUNK_SIZE}",
+            lambda: BM25Index(process_aggregate(form.snapshot())),
+        )
+        if index is None:
+            return None
+        return "\n".join(index.select(query, CONTEXT_TOKEN_BUDGET, top_k=CONTEXT_TOP_K))
+
+
+def build_survey_context(survey_data: SurveyData, query: str) -> str:
+    """
+    Selects the survey chunks most relevant to `query` within the context token budget.
+    """
+    with span("chat.retrieval"):
+        index = get_survey_index(survey_data)
+        return "\n".join(index.select(query, CONTEXT_TOKEN_BUDGET, top_k=CONTEXT_TOP_K))
+
+
+async def ask_llm_chain(llm_chain, data: str, query: str):
+    """
+    Invokes the chat chain asynchronously under the shared concurrency limiter.
+    """
+    with span("chat.llm") as chat_span:
+        response = await with_retries(
+            lambda: llm_chain.ainvoke({"data": data, "query": query}),
+            tokens=estimate_tokens(data) + estimate_tokens(query),
+        )
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            chat_span.set_usage(usage.get("input_tokens"), usage.get("output_tokens"))
+    return response
+
+
+def normalize_query(query: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a question, ignoring trailing punctuation, so
+    "Summarize this" and "summarize this?" share a cached answer.
+    """
+    return re.sub(r"\s+", " ", query.casefold()).strip().rstrip("?!. ")
+
+
+def answer_cache_key(survey_key: str, query: str) -> str:
+    return make_cache_key(_ANSWER_CONFIG_KEY, survey_key, normalize_query(query))
+
+
+def lookup_answer(key: str):
+    """
+    Returns the cached answer for `key` (see `answer_cache_key`), or None, counting the
+    hit or miss.
+    """
+    value = answer_cache.get(key)
+    if value is None:
+        answer_cache.misses += 1
+        chat_answers.inc("miss")
+    else:
+        answer_cache.hits += 1
+        chat_answers.inc("hit")
+    return value
+
+
+async def cached_answer(survey_key: str, query: str, build_context):
+    """
+    Answers `query` about one survey version, reusing an earlier answer to the same
+    normalized question. Concurrent identical questions share a single upstream call.
+
+    Args:
+        survey_key (str): Identifies the survey version, e.g. its content hash.
+        query (str): The user's question.
+        build_context (callable): Coroutine function returning the retrieval context; only
+            called on a cache miss.
+
+    Returns:
+        tuple: (answer, hit) where `hit` is True when no upstream call was made.
+    """
+    async def answer():
+        context = await build_context()
+        response = await ask_llm_chain(initialize_llm_chain(), context, query)
+        return response.content
+
+    key = answer_cache_key(survey_key, query)
+    # Empty answers are not cached
+    value, hit = await answer_cache.get_or_compute(key, answer, cache_if=bool)
+    chat_answers.inc("hit" if hit else "miss")
+    return value, hit
+
+
+async def stream_llm_chain(llm_chain, data: str, query: str):
+    """
+    Streams the chat chain's answer as content deltas under the shared concurrency limiter.
+    """
+    stream = stream_with_retries(
+        lambda: llm_chain.astream({"data": data, "query": query}),
+        tokens=estimate_tokens(data) + estimate_tokens(query),
     )
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-    return text_splitter.split_text(responses_str)
\ No newline at end of file
+    async for chunk in stream:
+        if chunk.content:
+            yield chunk.content
+
+
+async def stream_and_cache_answer(key: str, llm_chain, data: str, query: str):
+    """
+    Like `stream_llm_chain`, and stores the full answer under `key` once the stream
+    completes, so the question is answered from the cache next time.
+    """
+    parts = []
+    async for delta in stream_llm_chain(llm_chain, data, query):
+        parts.append(delta)
+        yield delta
+    if parts:
+        answer_cache.set(key, "".join(parts))
\ No newline at end of file
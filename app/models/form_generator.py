@@ -1,26 +1,24 @@
-import openai
-from dotenv import load_dotenv
-import os
+import json
+import re
+from app.models.llm_client import chat_completion, stream_chat_completion
+from app.models.metrics import span
+from app.models.result_cache import ResultCache, make_cache_key
+from app.models.settings import settings
 
-# Load OpenAI API key from .env
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+FORM_MODEL = "gpt-4"
+# Bump whenever the prompt below changes so cached forms from the old prompt are not reused
+FORM_PROMPT_VERSION = "1"
 
-def analyze_researcher_input(goal: str, hypothesis: str, target_group: str, time_taken: int):
-    """
-    Generates a research form in JSON format using OpenAI's GPT-4 model based on researcher input.
-
-    Args:
-        goal (str): The research goal.
-        hypothesis (str): The research hypothesis.
-        target_group (str): The target group for the research.
-        time_taken (int): The estimated time to complete the research (in minutes).
+# Generated forms keyed on normalized researcher input; FORM_CACHE_DIR enables the disk tier
+form_cache = ResultCache(
+    max_entries=settings.form_cache_max_entries,
+    ttl=settings.form_cache_ttl,
+    disk_path=settings.form_cache_dir,
+    disk_max_entries=settings.form_cache_disk_max_entries,
+)
 
-    Returns:
-        str (or None): The generated research form in JSON format, or None if an error occurs.
-    """
-
-    prompt = f"""
+def _form_prompt(goal: str, hypothesis: str, target_group: str, time_taken: int) -> str:
+    return f"""
     You are a professional research assistant. Based on the following researcher inputs, generate a research form in JSON format:
 
     **Researcher Inputs:**
@@ -67,14 +65,31 @@ def analyze_researcher_input(goal: str, hypothesis: str, target_group: str, time
     ]
     """
 
+async def analyze_researcher_input(goal: str, hypothesis: str, target_group: str, time_taken: int):
+    """
+    Generates a research form in JSON format using OpenAI's GPT-4 model based on researcher input.
+
+    Args:
+        goal (str): The research goal.
+        hypothesis (str): The research hypothesis.
+        target_group (str): The target group for the research.
+        time_taken (int): The estimated time to complete the research (in minutes).
+
+    Returns:
+        str (or None): The generated research form in JSON format, or None if an error occurs.
+    """
+
+    prompt = _form_prompt(goal, hypothesis, target_group, time_taken)
+
     try:
-        # Using openai.Chat.completions.create for the new API
-        response = openai.chat.completions.create(
-            model="gpt-4",  # Using GPT-4 model
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=700,
-            temperature=0.7
-        )
+        # Non-blocking call through the shared, rate-limited async client
+        with span("form.generate"):
+            response = await chat_completion(
+                prompt,
+                model=FORM_MODEL,  # Using GPT-4 model
+                max_tokens=700,
+                temperature=0.7
+            )
 
         # Get the research form content (JSON) and strip whitespace
         research_form = response.choices[0].message.content.strip()
@@ -83,4 +98,143 @@ def analyze_researcher_input(goal: str, hypothesis: str, target_group: str, time
 
     except Exception as e:
         print(f"Error with OpenAI API: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def _normalize_text(value: str) -> str:
+    return re.sub(r"\s+", " ", value).strip().casefold()
+
+def _parse_form(research_form):
+    """
+    Returns the form's question objects, or None unless it is a non-empty JSON list of objects.
+    """
+    if not research_form:
+        return None
+    try:
+        items = json.loads(research_form)
+    except ValueError:
+        return None
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return None
+    return items
+
+def _is_valid_form(research_form) -> bool:
+    # Only a list of question objects is cached; a bad completion should be retried next time
+    return _parse_form(research_form) is not None
+
+def form_cache_key(goal: str, hypothesis: str, target_group: str, time_taken: int) -> str:
+    """
+    Builds the cache key for a research form from the normalized researcher input,
+    the model and the prompt version.
+    """
+    return make_cache_key(
+        FORM_MODEL,
+        FORM_PROMPT_VERSION,
+        _normalize_text(goal),
+        _normalize_text(hypothesis),
+        _normalize_text(target_group),
+        int(time_taken),
+    )
+
+async def generate_research_form_cached(goal: str, hypothesis: str, target_group: str, time_taken: int):
+    """
+    Returns a research form from the cache, or generates it with GPT-4. Concurrent identical
+    requests share a single upstream call.
+
+    Returns:
+        tuple: (research_form, hit) where research_form is the JSON string or None.
+    """
+    key = form_cache_key(goal, hypothesis, target_group, time_taken)
+    return await form_cache.get_or_compute(
+        key,
+        lambda: analyze_researcher_input(goal, hypothesis, target_group, time_taken),
+        cache_if=_is_valid_form,
+    )
+
+class FormItemParser:
+    """
+    Incrementally parses a streamed JSON array of question objects, returning each object
+    as soon as its closing brace arrives. Text outside the array (e.g. code fences) is ignored.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.item = []
+
+    def feed(self, text: str):
+        """
+        Consumes the next chunk of streamed text.
+
+        Returns:
+            list[dict]: Question objects completed by this chunk.
+        """
+        items = []
+        for char in text:
+            if self.depth >= 2:
+                self.item.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth >= 1:
+                self.in_string = True
+            elif char in "[{":
+                if self.depth == 1 and char == "{":
+                    self.item = [char]
+                self.depth += 1
+            elif char in "]}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 1 and char == "}":
+                    items.append(json.loads("".join(self.item)))
+                    self.item = []
+        return items
+
+async def stream_research_form(goal: str, hypothesis: str, target_group: str, time_taken: int):
+    """
+    Streams a research form one complete question object at a time. Cached forms are replayed
+    directly; freshly generated ones are cached once the whole form has arrived and is valid.
+
+    Returns:
+        tuple: (items, hit) where `items` is an async iterator of question objects in form
+        order and `hit` is True when the form is replayed from the cache.
+    """
+    key = form_cache_key(goal, hypothesis, target_group, time_taken)
+    cached = _parse_form(await form_cache.aget(key))
+    if cached is not None:
+        form_cache.hits += 1
+        return _replay_form(cached), True
+
+    await form_cache.ainvalidate(key)  # Entries cached before forms were validated may not be lists
+    form_cache.misses += 1
+    return _generate_form_items(key, goal, hypothesis, target_group, time_taken), False
+
+async def _replay_form(items):
+    for item in items:
+        yield item
+
+async def _generate_form_items(key: str, goal: str, hypothesis: str, target_group: str, time_taken: int):
+    parser = FormItemParser()
+    parts = []
+    streamed = 0
+    prompt = _form_prompt(goal, hypothesis, target_group, time_taken)
+    async for delta in stream_chat_completion(prompt, model=FORM_MODEL, max_tokens=700, temperature=0.7):
+        parts.append(delta)
+        for item in parser.feed(delta):
+            streamed += 1
+            yield item
+
+    research_form = "".join(parts).strip()
+    items = _parse_form(research_form)
+    if items is not None:
+        await form_cache.aset(key, research_form)
+    if streamed:
+        return
+    # Nothing was recognized while streaming; fall back to the complete text
+    if items is None:
+        raise ValueError("The model did not return a JSON list of questions.")
+    for item in items:
+        yield item
\ No newline at end of file
@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from app.models.settings import settings
+
+# Report stages, in the order run_analysis reports them
+REPORT_STAGES = ["aggregate", "analysis", "charts", "wordcloud", "document"]
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the job queue is at capacity; callers should retry later.
+    """
+
+
+@dataclass
+class Job:
+    id: str
+    status: str = "queued"  # queued, running, completed or failed
+    stages: dict = field(default_factory=lambda: {stage: "pending" for stage in REPORT_STAGES})
+    created_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    result: str = None
+    error: str = None
+
+    def start_stage(self, stage: str):
+        """
+        Marks `stage` as running and every earlier stage as done.
+        """
+        for name in self.stages:
+            if name == stage:
+                self.stages[name] = "running"
+                break
+            self.stages[name] = "done"
+
+    def to_dict(self) -> dict:
+        done = sum(1 for state in self.stages.values() if state == "done")
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stages": dict(self.stages),
+            "progress": done / len(self.stages) if self.stages else 1.0,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    In-process bounded job queue drained by a fixed pool of asyncio workers.
+    """
+
+    def __init__(self, workers: int, max_size: int, ttl: float):
+        self.workers = workers
+        self.max_size = max_size
+        self.ttl = ttl  # Seconds finished jobs stay pollable
+        self._jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        if not self._tasks:
+            # Fresh contexts so workers don't inherit the submitting request's trace
+            self._tasks = [
+                asyncio.create_task(self._worker(), context=contextvars.Context())
+                for _ in range(self.workers)
+            ]
+
+    async def _worker(self):
+        while True:
+            job, run = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await run(job)
+                if job.result is None:
+                    raise RuntimeError("Job produced no result.")
+                for stage in job.stages:
+                    job.stages[stage] = "done"
+                job.status = "completed"
+            except Exception as e:
+                print(f"Job {job.id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, run) -> Job:
+        """
+        Enqueues a job without waiting for it to run.
+
+        Args:
+            run (callable): Coroutine function taking the Job (for progress updates) and
+                returning the job's result.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            QueueFullError: If the queue already holds `max_size` waiting jobs.
+        """
+        self._ensure_workers()
+        self._prune()
+        job = Job(id=uuid.uuid4().hex)
+        try:
+            self._queue.put_nowait((job, run))
+        except asyncio.QueueFull:
+            raise QueueFullError("Report queue is full, try again later.")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+
+report_jobs = JobQueue(
+    workers=settings.report_job_workers,
+    max_size=settings.report_job_queue_size,
+    ttl=settings.report_job_ttl,
+)
@@ -0,0 +1,264 @@
+import asyncio
+import inspect
+import random
+import time
+
+from app.models.metrics import record_usage
+from app.models.retrieval import estimate_tokens
+from app.models.settings import settings
+
+OPENAI_API_KEY = settings.openai_api_key
+OPENAI_BASE_URL = settings.openai_base_url
+MAX_CONCURRENCY = settings.openai_max_concurrency  # In-flight upstream calls
+MAX_CONNECTIONS = settings.openai_max_connections  # Pooled HTTP connections
+REQUEST_TIMEOUT = settings.openai_timeout  # Seconds per upstream call
+MAX_RETRIES = settings.openai_max_retries
+BACKOFF_BASE = settings.openai_backoff_base  # Seconds, doubled per attempt
+REQUESTS_PER_MINUTE = settings.openai_requests_per_minute  # 0 disables the limit
+TOKENS_PER_MINUTE = settings.openai_tokens_per_minute  # 0 disables the limit
+
+_http_client = None
+_client = None
+_semaphore = None
+_rate_limiter = None
+_retryable_errors = None
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter on upstream requests and estimated tokens per minute, shared by
+    every caller so batch fan-out cannot exceed the account's rate limits.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    async def acquire(self, tokens: int = 0):
+        """
+        Waits until one request and `tokens` tokens fit in the budget, then spends them.
+        """
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)  # A single oversized call must still run
+        # Callers queue on the lock, so budget is handed out in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                if self.requests_per_minute and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+                if self.tokens_per_minute and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests_per_minute:
+                self._requests -= 1
+            if self.tokens_per_minute:
+                self._tokens -= tokens
+
+
+def retryable_errors():
+    """
+    Errors worth retrying; anything else (bad request, auth) fails immediately. The openai
+    package is only imported once the first upstream call is made.
+    """
+    global _retryable_errors
+    if _retryable_errors is None:
+        import openai
+
+        _retryable_errors = (
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.RateLimitError,
+            openai.InternalServerError,
+        )
+    return _retryable_errors
+
+
+def get_http_client():
+    """
+    Returns the pooled HTTP client shared by every upstream LLM call for the app's lifetime.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        import httpx
+
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+        )
+    return _http_client
+
+
+def get_client():
+    """
+    Returns the shared AsyncOpenAI client. Retries are handled by `with_retries`, so the
+    SDK's own retry loop is disabled to keep the semaphore accounting accurate.
+    """
+    global _client
+    if _client is None or _http_client is None or _http_client.is_closed:
+        import openai
+
+        _client = openai.AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            http_client=get_http_client(),
+            timeout=REQUEST_TIMEOUT,
+            max_retries=0,
+        )
+    return _client
+
+
+def get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphore
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    return _rate_limiter
+
+
+async def with_retries(call, tokens: int = 0):
+    """
+    Runs an upstream LLM call under the rate and concurrency limiters, retrying transient
+    failures with exponential backoff and jitter.
+
+    Args:
+        call (callable): Zero-argument function returning a fresh awaitable for each attempt.
+        tokens (int): Estimated prompt plus completion tokens, charged to the token budget
+            on every attempt.
+
+    Returns:
+        The result of the awaited call.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            # Wait for budget before taking a concurrency slot, so waiting calls hold none
+            await get_rate_limiter().acquire(tokens)
+            async with get_semaphore():
+                return await call()
+        except retryable_errors() as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+            print(f"Retrying OpenAI call in {delay:.2f}s after error: {e}")
+            # Back off outside the semaphore so waiting calls can use the slot
+            await asyncio.sleep(delay)
+
+
+async def chat_completion(prompt: str, model: str = "gpt-4", max_tokens: int = 700, temperature: float = 0.7):
+    """
+    Sends a single-message chat completion through the shared client.
+
+    Args:
+        prompt (str): The user message content.
+        model (str): The OpenAI model name.
+        max_tokens (int): Completion token limit.
+        temperature (float): Sampling temperature.
+
+    Returns:
+        ChatCompletion: The raw OpenAI response.
+    """
+    response = await with_retries(
+        lambda: get_client().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+        ),
+        tokens=estimate_tokens(prompt) + max_tokens,
+    )
+    # Attribute token usage to the active tracing span
+    record_usage(response.usage)
+    return response
+
+
+async def stream_with_retries(open_stream, tokens: int = 0):
+    """
+    Iterates an upstream streaming call under the rate and concurrency limiters. Transient
+    failures are retried with backoff only until the first item arrives; after that they
+    propagate, since the caller has already forwarded partial output.
+
+    Args:
+        open_stream (callable): Zero-argument function returning an async iterator, or an
+            awaitable resolving to one, for each attempt.
+        tokens (int): Estimated prompt plus completion tokens, as for `with_retries`.
+
+    Yields:
+        Items from the upstream stream.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        started = False
+        try:
+            await get_rate_limiter().acquire(tokens)
+            async with get_semaphore():
+                stream = open_stream()
+                if inspect.isawaitable(stream):
+                    stream = await stream
+                async for item in stream:
+                    started = True
+                    yield item
+            return
+        except retryable_errors() as e:
+            if started or attempt == MAX_RETRIES:
+                raise
+            delay = BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+            print(f"Retrying OpenAI stream in {delay:.2f}s after error: {e}")
+            await asyncio.sleep(delay)
+
+
+async def stream_chat_completion(prompt: str, model: str = "gpt-4", max_tokens: int = 700, temperature: float = 0.7):
+    """
+    Streams a single-message chat completion through the shared client.
+
+    Yields:
+        str: Content deltas as the model produces them.
+    """
+    stream = stream_with_retries(
+        lambda: get_client().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+        ),
+        tokens=estimate_tokens(prompt) + max_tokens,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def close_client():
+    """
+    Closes the pooled HTTP client; called on application shutdown.
+    """
+    global _http_client, _client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+    _client = None
@@ -0,0 +1,186 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits up to long GPT-4 calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Spans finished during the current request, for the optional Server-Timing header
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = [("le", repr(float(bound)))]
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {count}")
+                inf = [("le", "+Inf")]
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, inf)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "formverse_stage_duration_seconds", "Time spent in each pipeline stage.", labels=("stage",)
+)
+stage_errors = Counter(
+    "formverse_stage_errors_total", "Pipeline stages that raised an exception.", labels=("stage",)
+)
+llm_tokens = Counter(
+    "formverse_llm_tokens_total", "OpenAI tokens used, from the response usage field.", labels=("stage", "kind")
+)
+http_request_seconds = Histogram(
+    "formverse_http_request_duration_seconds", "HTTP request latency.", labels=("method", "path", "status")
+)
+chat_answers = Counter(
+    "formverse_chat_answers_total", "Chat answers served from the answer cache or upstream.", labels=("cache",)
+)
+
+REGISTRY = [stage_seconds, stage_errors, llm_tokens, http_request_seconds, chat_answers]
+
+
+class Span:
+    """
+    A timed pipeline stage with optional attributes such as token counts.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.attributes = {}
+        self.duration = None
+
+    def set_usage(self, prompt_tokens, completion_tokens):
+        """
+        Records token counts from an OpenAI `usage` field on the span and in the token counter.
+        """
+        if prompt_tokens is not None:
+            self.attributes["prompt_tokens"] = self.attributes.get("prompt_tokens", 0) + prompt_tokens
+            llm_tokens.inc(self.name, "prompt", amount=prompt_tokens)
+        if completion_tokens is not None:
+            self.attributes["completion_tokens"] = self.attributes.get("completion_tokens", 0) + completion_tokens
+            llm_tokens.inc(self.name, "completion", amount=completion_tokens)
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Times the enclosed block as pipeline stage `name`. Works in sync and async code, and in
+    worker threads started with asyncio.to_thread (which copy the request context).
+    """
+    current = Span(name)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        stage_errors.inc(name)
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        stage_seconds.observe(current.duration, name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append(current)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def record_usage(usage):
+    """
+    Adds an OpenAI response's token usage to the innermost active span, if any.
+    """
+    active = _current_span.get()
+    if active is not None and usage is not None:
+        active.set_usage(getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+
+
+def start_request_trace():
+    """
+    Starts collecting spans for the current request; returns the list they are appended to.
+    """
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing_header(spans) -> str:
+    """
+    Formats finished spans as a Server-Timing header value (durations in milliseconds).
+    """
+    entries = []
+    for s in spans:
+        entry = f"{s.name.replace(' ', '_')};dur={s.duration * 1000:.1f}"
+        if s.attributes:
+            desc = " ".join(f"{k}={v}" for k, v in s.attributes.items())
+            entry += f';desc="{desc}"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
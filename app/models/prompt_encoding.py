@@ -0,0 +1,130 @@
+import math
+import random
+
+from app.models.retrieval import estimate_tokens
+
+
+def _answer_line(value: str, count: int) -> str:
+    return f"- {value} (x{count})" if count > 1 else f"- {value}"
+
+
+def question_header(q, respondent_count: int) -> str:
+    kind = "open-ended" if q.kind == "open" else q.kind
+    return f"Question: {q.question} [{kind}, {q.answered} of {respondent_count} answered]"
+
+
+def closed_lines(q) -> list:
+    """
+    The option distribution of a closed-ended question as `- option: count (share)` lines.
+    """
+    total = int(q.counts.sum()) if q.counts is not None else 0
+    return [
+        f"- {label}: {count} ({count / total:.1%})" if total else f"- {label}: 0"
+        for label, count in zip(q.labels, q.counts.tolist())
+    ]
+
+
+def open_lines(q, token_budget: int = None) -> list:
+    """
+    Distinct open-ended answers with their counts, most frequent first.
+
+    When the lines exceed `token_budget`, a stratified sample is kept instead: answers are
+    grouped by frequency tier (powers of two), each tier gets budget in proportion to the
+    responses it covers, and answers are drawn at random within a tier. A final line says
+    how much was left out.
+    """
+    entries = sorted(zip(q.values, q.value_counts.tolist()), key=lambda item: (-item[1], item[0]))
+    lines = [_answer_line(value, count) for value, count in entries]
+    costs = [estimate_tokens(line) for line in lines]
+    if token_budget is None or sum(costs) <= token_budget:
+        return lines
+
+    tiers = {}
+    for i, (_, count) in enumerate(entries):
+        tiers.setdefault(int(math.log2(count)), []).append(i)
+    total_responses = sum(count for _, count in entries)
+    rng = random.Random(q.index)  # Deterministic, so identical surveys give identical prompts
+    budget = token_budget - estimate_tokens("- ... 000000 more distinct answers (0000000 responses) not shown")
+    chosen = []
+    carry = 0
+    for tier in sorted(tiers, reverse=True):
+        members = tiers[tier]
+        share = sum(entries[i][1] for i in members) / total_responses
+        tier_budget = int(budget * share) + carry
+        order = members[:]
+        rng.shuffle(order)
+        for i in order:
+            if costs[i] <= tier_budget:
+                chosen.append(i)
+                tier_budget -= costs[i]
+        carry = tier_budget  # Unspent budget rolls over to the next (rarer) tier
+
+    chosen.sort()
+    sampled = [lines[i] for i in chosen]
+    omitted = len(entries) - len(chosen)
+    if omitted:
+        omitted_responses = total_responses - sum(entries[i][1] for i in chosen)
+        sampled.append(f"- ... {omitted} more distinct answers ({omitted_responses} responses) not shown")
+    return sampled
+
+
+def encode_question(q, respondent_count: int, token_budget: int = None) -> str:
+    lines = closed_lines(q) if q.is_closed else open_lines(q, token_budget)
+    return "\n".join([question_header(q, respondent_count)] + lines)
+
+
+def encode_survey(aggregate, token_budget: int = None) -> str:
+    """
+    Encodes a survey aggregate for a prompt: closed-ended questions as option-count tables,
+    open-ended ones as deduplicated answers with counts.
+
+    Closed-ended tables are always complete. If `token_budget` is given, whatever remains
+    after them is shared by the open-ended questions, and each one is sampled (see
+    `open_lines`) only if it does not fit its share.
+
+    Returns:
+        str: One block per answered question, in question order.
+    """
+    questions = [q for q in aggregate.questions if q.answered]
+    if token_budget is None:
+        return "\n\n".join(encode_question(q, aggregate.respondent_count) for q in questions)
+
+    blocks = {}
+    remaining = token_budget
+    for q in questions:
+        if q.is_closed:
+            blocks[q.index] = encode_question(q, aggregate.respondent_count)
+            remaining -= estimate_tokens(blocks[q.index])
+
+    # Smallest first, so budget a short question does not need goes to the larger ones
+    open_questions = [q for q in questions if not q.is_closed]
+    full_costs = {q.index: sum(estimate_tokens(line) for line in open_lines(q)) for q in open_questions}
+    open_questions.sort(key=lambda q: full_costs[q.index])
+    for n, q in enumerate(open_questions):
+        header_cost = estimate_tokens(question_header(q, aggregate.respondent_count))
+        share = max(0, remaining // (len(open_questions) - n) - header_cost)
+        blocks[q.index] = encode_question(q, aggregate.respondent_count, share)
+        remaining -= estimate_tokens(blocks[q.index])
+
+    return "\n\n".join(blocks[q.index] for q in questions)
+
+
+def encode_survey_chunks(aggregate, chunk_tokens: int) -> list:
+    """
+    Splits the full (unsampled) encoding into retrieval chunks of about `chunk_tokens`,
+    each starting with its question header.
+    """
+    chunks = []
+    for q in aggregate.questions:
+        header = question_header(q, aggregate.respondent_count)
+        lines = closed_lines(q) if q.is_closed else open_lines(q)
+        current, used = [], estimate_tokens(header)
+        for line in lines:
+            cost = estimate_tokens(line)
+            if current and used + cost > chunk_tokens:
+                chunks.append("\n".join([header] + current))
+                current, used = [], estimate_tokens(header)
+            current.append(line)
+            used += cost
+        chunks.append("\n".join([header] + current))
+    return chunks
@@ -0,0 +1,178 @@
+import csv
+import html
+import io
+import json
+
+from app.models.text_analytics import top_terms
+
+# Report formats and their media types; everything but docx skips raster charts and python-docx
+REPORT_MEDIA_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "json": "application/json",
+    "html": "text/html; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Formats that include the GPT analysis; CSV carries only the distributions
+ANALYZED_FORMATS = {"docx", "json", "html"}
+
+TOP_TERMS = 20
+
+# Pairs of closed-ended questions cross-tabulated in the JSON report
+MAX_CROSSTABS = 20
+
+# FormData fields shown in reports; also what stored and incremental surveys keep for them
+SURVEY_FIELDS = ("title", "goal", "hypothesis", "targetGroup", "timeTaken")
+
+
+def question_stats(q, aggregate, top_term_count: int = TOP_TERMS) -> dict:
+    """
+    The statistics reported for one question: option distribution for closed-ended
+    questions, top terms for open-ended ones.
+    """
+    return {
+        "question": q.question,
+        "kind": q.kind,
+        "answered": q.answered,
+        "response_rate": aggregate.response_rate(q),
+        "distribution": q.distribution(),
+        "top_terms": top_terms(q, top_term_count),
+    }
+
+
+def crosstabs(aggregate, limit: int = MAX_CROSSTABS) -> list:
+    """
+    Respondent counts for each pair of answered closed-ended questions, in question order,
+    up to `limit` pairs. Empty for aggregates without per-respondent answers (e.g. those
+    kept incrementally by the aggregate store).
+    """
+    closed = [q for q in aggregate.closed_questions() if q.answered and q.first_codes is not None]
+    tables = []
+    for i, qa in enumerate(closed):
+        for qb in closed[i + 1:]:
+            if len(tables) >= limit:
+                return tables
+            tables.append({
+                "questions": [qa.question, qb.question],
+                "rows": qa.labels,
+                "columns": qb.labels,
+                "counts": aggregate.crosstab(qa.index, qb.index).tolist(),
+            })
+    return tables
+
+
+def report_json(survey_data, aggregate, gpt_analysis) -> dict:
+    report = {name: survey_data.get(name) for name in SURVEY_FIELDS}
+    report.update({
+        "respondents": aggregate.respondent_count,
+        "analysis": gpt_analysis,
+        "questions": [question_stats(q, aggregate) for q in aggregate.questions],
+        "crosstabs": crosstabs(aggregate),
+    })
+    return report
+
+
+def render_json(survey_data, aggregate, gpt_analysis) -> str:
+    return json.dumps(report_json(survey_data, aggregate, gpt_analysis), indent=2)
+
+
+def render_csv(aggregate) -> str:
+    """
+    One row per option (closed-ended) or top term (open-ended) of every question.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["question_index", "question", "kind", "value", "count", "share"])
+    for q in aggregate.questions:
+        if q.is_closed:
+            total = int(q.counts.sum())
+            for label, count in zip(q.labels, q.counts.tolist()):
+                writer.writerow([q.index, q.question, q.kind, label, count, f"{count / total:.4f}" if total else ""])
+        else:
+            for term, count in top_terms(q, TOP_TERMS):
+                writer.writerow([q.index, q.question, "open_term", term, count, ""])
+    return buffer.getvalue()
+
+
+def svg_bar_chart(labels, counts, width: int = 520, bar_height: int = 22) -> str:
+    """
+    A horizontal bar chart as inline SVG markup, sized to its number of bars.
+    """
+    label_width = 170
+    value_width = 60
+    gap = 6
+    plot_width = width - label_width - value_width
+    peak = max(counts, default=0) or 1
+    total = sum(counts)
+    height = len(labels) * (bar_height + gap) + gap
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" role="img">']
+    for i, (label, count) in enumerate(zip(labels, counts)):
+        y = gap + i * (bar_height + gap)
+        bar = plot_width * count / peak
+        share = f" ({count / total:.0%})" if total else ""
+        parts.append(
+            f'<text x="{label_width - 8}" y="{y + bar_height * 0.7:.1f}" text-anchor="end">{html.escape(str(label))}</text>'
+            f'<rect x="{label_width}" y="{y}" width="{bar:.1f}" height="{bar_height}" fill="#4c72b0"/>'
+            f'<text x="{label_width + bar + 6:.1f}" y="{y + bar_height * 0.7:.1f}">{count}{share}</text>'
+        )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+HTML_STYLE = """
+body { font-family: -apple-system, "Segoe UI", Helvetica, Arial, sans-serif; max-width: 860px; margin: 2em auto; color: #222; }
+svg text { font-size: 13px; fill: #222; }
+.meta { color: #555; }
+.question { margin: 1.5em 0; }
+"""
+
+
+def render_html(survey_data, aggregate, gpt_analysis) -> str:
+    """
+    A self-contained HTML report: metadata, analysis text and an inline SVG chart per
+    closed-ended question, plus top-term charts for open-ended ones.
+    """
+    esc = html.escape
+    parts = [
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8"><title>Survey Analysis Report</title>',
+        f"<style>{HTML_STYLE}</style></head><body>",
+        "<h1>Survey Analysis Report</h1>",
+        '<div class="meta">',
+        f"<p>Goal: {esc(str(survey_data.get('goal')))}</p>",
+        f"<p>Hypothesis: {esc(str(survey_data.get('hypothesis')))}</p>",
+        f"<p>Target Group: {esc(str(survey_data.get('targetGroup')))}</p>",
+        f"<p>Time Taken (in minutes): {esc(str(survey_data.get('timeTaken')))}</p>",
+        f"<p>Respondents: {aggregate.respondent_count}</p>",
+        "</div>",
+        "<h2>Analysis</h2>",
+    ]
+    parts.extend(f"<p>{esc(paragraph)}</p>" for paragraph in (gpt_analysis or "").split("\n\n") if paragraph.strip())
+
+    parts.append("<h2>Results</h2>")
+    for q in aggregate.questions:
+        parts.append('<div class="question">')
+        parts.append(f"<h3>{esc(q.question)}</h3>")
+        parts.append(
+            f"<p>Response rate: {aggregate.response_rate(q):.1%} ({q.answered} of {aggregate.respondent_count})</p>"
+        )
+        if q.is_closed:
+            parts.append(svg_bar_chart(q.labels, q.counts.tolist()))
+        else:
+            terms = top_terms(q, 10)
+            if terms:
+                parts.append("<p>Top terms</p>")
+                parts.append(svg_bar_chart([term for term, _ in terms], [count for _, count in terms]))
+        parts.append("</div>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def render_report(output_format: str, survey_data, aggregate, gpt_analysis) -> str:
+    if output_format == "json":
+        return render_json(survey_data, aggregate, gpt_analysis)
+    if output_format == "html":
+        return render_html(survey_data, aggregate, gpt_analysis)
+    if output_format == "csv":
+        return render_csv(aggregate)
+    raise ValueError(f"Unsupported report format '{output_format}'.")
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import re
+
+from app.models.result_cache import SingleFlight, make_cache_key
+from app.models.settings import settings
+from app.models.survey_store import survey_content_hash
+
+# Bump whenever report content or layout changes so stale artifacts are not served
+REPORT_VERSION = "5"
+
+# Artifacts are named by content hash; anything else in the directory is left alone
+_ARTIFACT_NAME = re.compile(r"^[0-9a-f]{64}\.\w+$")
+
+
+def report_cache_key(survey_data) -> str:
+    """
+    Hashes the validated FormData with the report version.
+    """
+    return content_report_key(survey_content_hash(survey_data))
+
+
+def content_report_key(content_hash: str) -> str:
+    """
+    The report key for a content hash or a stored form's state key (`FormAggregate.cache_key`).
+    """
+    return make_cache_key(REPORT_VERSION, content_hash)
+
+
+class ReportStore:
+    """
+    Size-capped directory of generated report artifacts keyed by content hash, with LRU
+    cleanup by last access time and single-flight generation per key.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._flights = SingleFlight()
+        if not os.path.exists(root):
+            os.makedirs(root)
+
+    def filename_for(self, key: str, ext: str = ".docx") -> str:
+        return f"{key}{ext}"
+
+    def path_for(self, key: str, ext: str = ".docx") -> str:
+        return os.path.join(self.root, self.filename_for(key, ext))
+
+    def lookup(self, key: str, ext: str = ".docx"):
+        """
+        Returns the stored artifact path for `key`, or None. A hit refreshes its LRU position.
+        """
+        path = self.path_for(key, ext)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    async def get_or_create(self, key: str, build, ext: str = ".docx"):
+        """
+        Returns the stored artifact for `key`, building it once for all concurrent callers.
+
+        Args:
+            key (str): The content hash of the request.
+            build (callable): Coroutine function taking (output_path, filename) and
+                returning the written file path, or None on failure.
+            ext (str): Artifact file extension.
+
+        Returns:
+            tuple: (path, hit) where `hit` is True when no new report was generated.
+        """
+        path = self.lookup(key, ext)
+        if path is not None:
+            return path, True
+
+        async def build_and_store():
+            path = await build(self.root, self.filename_for(key, ext))
+            if path is not None:
+                await asyncio.to_thread(self.enforce_limit, keep=path)
+            return path
+
+        # A report already being built for another caller is awaited, not started again
+        path, joined = await self._flights.run((key, ext), build_and_store)
+        return path, joined
+
+    def enforce_limit(self, keep: str = None):
+        """
+        Deletes least recently used artifacts until the store fits within `max_bytes`.
+        """
+        artifacts = []
+        total = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_file() or not _ARTIFACT_NAME.match(entry.name):
+                    continue
+                stat = entry.stat()
+                artifacts.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        artifacts.sort()  # Oldest access first
+        for _, size, path in artifacts:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                print(f"Error removing report artifact {path}: {e}")
+
+
+report_store = ReportStore(
+    root=settings.report_output_dir,
+    max_bytes=settings.report_store_max_bytes,
+)
@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(*parts):
+    """
+    Builds a content-addressed cache key from JSON-serializable parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one computation.
+
+    The computation runs in its own task, so a caller that is cancelled (e.g. its client
+    disconnected) only stops waiting; the other callers still get the result.
+    """
+
+    def __init__(self):
+        self._tasks = {}  # key -> asyncio.Task shared by concurrent callers
+
+    def join(self, key, compute):
+        """
+        Starts `compute` for `key`, or joins the computation already running for it.
+
+        Args:
+            key: Any hashable key.
+            compute (callable): Zero-argument coroutine function.
+
+        Returns:
+            tuple: (task, joined) where `joined` is True when the task was already running.
+        """
+        task = self._tasks.get(key)
+        if task is not None:
+            return task, True
+        task = asyncio.get_running_loop().create_task(compute())
+        self._tasks[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return task, False
+
+    def _finish(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved so a failure nobody waited for is not logged
+
+    async def run(self, key, compute):
+        """
+        Awaits the shared computation for `key`; see `join`.
+        """
+        task, joined = self.join(key, compute)
+        return await asyncio.shield(task), joined
+
+
+class ResultCache:
+    """
+    In-memory LRU/TTL cache with an optional on-disk tier and single-flight coalescing.
+
+    Values must be JSON-serializable when the disk tier is enabled. `get`, `set` and
+    `invalidate` are thread-safe, so the cache can be shared with asyncio.to_thread workers.
+    With the disk tier enabled they block on file I/O; coroutines use `aget`, `aset` and
+    `ainvalidate`, which do the disk work in a worker thread.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600, disk_path: str = None, disk_max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self._disk_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()  # Guards _entries; disk I/O happens outside it
+        self._flights = SingleFlight()
+        if disk_path:
+            if not os.path.exists(disk_path):
+                os.makedirs(disk_path)
+            self.sweep_disk()  # Drop what expired while the app was down
+
+    def _disk_file(self, key):
+        return os.path.join(self.disk_path, f"{key}.json")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_file(key), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if record["expires_at"] < time.time():
+            self._remove_disk(key)
+            return None
+        return record
+
+    def _write_disk(self, key, expires_at, value):
+        path = self._disk_file(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f)
+            os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+        except OSError as e:
+            print(f"Error writing cache entry to disk: {e}")
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._disk_file(key))
+        except OSError:
+            pass
+
+    def sweep_disk(self):
+        """
+        Deletes expired entry files (and stale temporary files), then the oldest entries
+        beyond `disk_max_entries`. Files are written when an entry is set, so an entry
+        expires `ttl` seconds after its file's modification time.
+        """
+        now = time.time()
+        entries = []
+        with os.scandir(self.disk_path) as scan:
+            for entry in scan:
+                if not entry.is_file() or not entry.name.endswith((".json", ".tmp")):
+                    continue
+                try:
+                    modified = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if modified + self.ttl < now:
+                    self._remove_path(entry.path)
+                elif entry.name.endswith(".json"):
+                    entries.append((modified, entry.path))
+        entries.sort()  # Oldest first
+        for _, path in entries[:max(0, len(entries) - self.disk_max_entries)]:
+            self._remove_path(path)
+
+    def _remove_path(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= time.time():
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+        return None
+
+    def _load_disk(self, key):
+        record = self._read_disk(key)
+        if record is None:
+            return None
+        self._store(key, record["expires_at"], record["value"])
+        return record["value"]
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None on a miss or expiry.
+        """
+        value = self._get_memory(key)
+        if value is None and self.disk_path:
+            value = self._load_disk(key)
+        return value
+
+    async def aget(self, key):
+        """
+        Like `get`, without blocking the event loop on the disk tier.
+        """
+        value = self._get_memory(key)
+        if value is None and self.disk_path:
+            value = await asyncio.to_thread(self._load_disk, key)
+        return value
+
+    def _store(self, key, expires_at, value):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _persist(self, key, expires_at, value):
+        self._write_disk(key, expires_at, value)
+        # Entries that are never read again are only removed by a sweep
+        with self._lock:
+            self._disk_writes += 1
+            sweep = self._disk_writes % max(1, self.disk_max_entries // 10) == 0
+        if sweep:
+            self.sweep_disk()
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl
+        self._store(key, expires_at, value)
+        if self.disk_path:
+            self._persist(key, expires_at, value)
+
+    async def aset(self, key, value):
+        """
+        Like `set`; the disk write (and any sweep it triggers) runs in a worker thread.
+        """
+        expires_at = time.time() + self.ttl
+        self._store(key, expires_at, value)
+        if self.disk_path:
+            await asyncio.to_thread(self._persist, key, expires_at, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_path:
+            self._remove_disk(key)
+
+    async def ainvalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_path:
+            await asyncio.to_thread(self._remove_disk, key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def get_or_compute(self, key, compute, cache_if=None):
+        """
+        Returns a cached value, or runs `compute` once for all concurrent callers of `key`.
+
+        Args:
+            key (str): The cache key.
+            compute (callable): Zero-argument coroutine function producing the value.
+            cache_if (callable, optional): Predicate deciding whether a result is cached.
+                Defaults to caching anything that is not None.
+
+        Returns:
+            tuple: (value, hit) where `hit` is True when no new upstream work was started.
+        """
+        value = await self.aget(key)
+        if value is not None:
+            self.hits += 1
+            return value, True
+
+        async def compute_and_store():
+            # Cached here rather than by the caller, so the result is kept even if every
+            # caller stopped waiting
+            value = await compute()
+            if (cache_if or (lambda v: v is not None))(value):
+                await self.aset(key, value)
+            return value
+
+        # Identical in-flight request: wait for it instead of calling upstream again
+        task, joined = self._flights.join(key, compute_and_store)
+        if joined:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return await asyncio.shield(task), joined
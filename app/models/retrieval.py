@@ -0,0 +1,82 @@
+import math
+import re
+from collections import Counter
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough GPT token estimate (~4 characters per token) that needs no tokenizer download.
+    """
+    return len(text) // 4 + 1
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over a survey's text chunks, built locally with no network access.
+    """
+
+    def __init__(self, chunks, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(chunks)) if chunks else 0.0
+        doc_freqs = Counter()
+        for tf in self.term_freqs:
+            doc_freqs.update(tf.keys())
+        n = len(chunks)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def scores(self, query: str):
+        query_terms = [t for t in set(tokenize(query)) if t in self.idf]
+        scores = [0.0] * len(self.chunks)
+        for i, tf in enumerate(self.term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+            for term in query_terms:
+                freq = tf.get(term)
+                if freq:
+                    scores[i] += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+        return scores
+
+    def select(self, query: str, token_budget: int, top_k: int = None):
+        """
+        Picks the best-matching chunks that fit the token budget.
+
+        Args:
+            query (str): The user's question.
+            token_budget (int): Maximum estimated prompt tokens for the selected chunks.
+            top_k (int, optional): Maximum number of chunks to consider.
+
+        Returns:
+            list[str]: Selected chunks in their original survey order. When nothing in
+            the survey matches the query (e.g. "summarize this"), chunks are taken from
+            the start of the survey instead.
+        """
+        scores = self.scores(query)
+        if any(scores):
+            ranked = sorted(range(len(self.chunks)), key=lambda i: scores[i], reverse=True)
+            ranked = [i for i in ranked if scores[i] > 0]
+        else:
+            ranked = list(range(len(self.chunks)))
+        if top_k is not None:
+            ranked = ranked[:top_k]
+
+        selected = []
+        used = 0
+        for i in ranked:
+            cost = estimate_tokens(self.chunks[i])
+            if used + cost > token_budget:
+                continue
+            selected.append(i)
+            used += cost
+        return [self.chunks[i] for i in sorted(selected)]
@@ -0,0 +1,137 @@
+import os
+from dataclasses import dataclass
+
+from dotenv import load_dotenv  # For loading the API key from environment variables
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Application configuration, read from the environment (and .env) once at import time.
+    """
+    # OpenAI client
+    openai_api_key: str
+    openai_base_url: str  # Overrides the API endpoint, e.g. a local stand-in for benchmarks
+    openai_max_concurrency: int  # In-flight upstream calls
+    openai_max_connections: int  # Pooled HTTP connections
+    openai_timeout: float  # Seconds per upstream call
+    openai_max_retries: int
+    openai_backoff_base: float  # Seconds, doubled per attempt
+    openai_requests_per_minute: int  # Global upstream rate limit; 0 disables it
+    openai_tokens_per_minute: int  # Global estimated token budget; 0 disables it
+
+    # Research form cache
+    form_cache_max_entries: int
+    form_cache_ttl: float
+    form_cache_dir: str  # Enables the on-disk tier when set
+    form_cache_disk_max_entries: int
+    form_batch_max_items: int  # Researcher inputs accepted per batch request
+
+    # Survey reports
+    report_output_dir: str
+    report_store_max_bytes: int
+    report_chart_dpi: int
+    report_chart_scale: float
+    report_render_workers: int
+    report_render_parallel_threshold: int
+    report_job_workers: int
+    report_job_queue_size: int
+    report_job_ttl: float
+    analysis_context_tokens: int
+    analysis_batch_tokens: int
+    analysis_partial_max_tokens: int
+    analysis_map_concurrency: int
+    analysis_map_reduce: bool  # Summarize oversized surveys in batches instead of sampling them
+
+    # Incremental per-form aggregates
+    aggregate_max_distinct_values: int  # Per question; the long tail is pruned beyond this
+    aggregate_max_terms: int  # Open-ended word frequencies kept per question
+    upload_batch_rows: int  # NDJSON respondents validated and applied per batch
+    upload_max_line_bytes: int
+
+    # Uploaded surveys, referenced by form _id from the chat and report endpoints
+    survey_store_path: str  # SQLite database file
+    survey_artifact_cache_size: int  # Derived artifacts kept unpickled in memory
+    survey_artifact_ttl: float
+
+    # Open-ended text analytics
+    text_ngram_max: int  # Longest n-gram counted as a term (1 = single words)
+    text_extra_stopwords: str  # Comma-separated, added to the built-in English list
+    text_term_cache_size: int
+    text_term_cache_ttl: float
+
+    # Observability
+    metrics_timing_header: bool  # Add a Server-Timing header with per-stage spans to every response
+
+    # Survey chat
+    chat_chunk_size: int  # Characters per retrieval chunk
+    chat_context_token_budget: int  # Prompt tokens spent on survey data
+    chat_context_top_k: int
+    chat_index_cache_size: int
+    chat_index_cache_ttl: float
+    chat_answer_cache_size: int  # Answers kept per survey version and question; 0 disables
+    chat_answer_cache_ttl: float
+
+    @classmethod
+    def from_env(cls):
+        load_dotenv()
+        return cls(
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            openai_base_url=os.getenv("OPENAI_BASE_URL") or None,
+            openai_max_concurrency=_env_int("OPENAI_MAX_CONCURRENCY", 8),
+            openai_max_connections=_env_int("OPENAI_MAX_CONNECTIONS", 20),
+            openai_timeout=_env_float("OPENAI_TIMEOUT", 60),
+            openai_max_retries=_env_int("OPENAI_MAX_RETRIES", 3),
+            openai_backoff_base=_env_float("OPENAI_BACKOFF_BASE", 0.5),
+            openai_requests_per_minute=_env_int("OPENAI_REQUESTS_PER_MINUTE", 0),
+            openai_tokens_per_minute=_env_int("OPENAI_TOKENS_PER_MINUTE", 0),
+            form_cache_max_entries=_env_int("FORM_CACHE_MAX_ENTRIES", 512),
+            form_cache_ttl=_env_float("FORM_CACHE_TTL", 86400),
+            form_cache_dir=os.getenv("FORM_CACHE_DIR") or None,
+            form_cache_disk_max_entries=_env_int("FORM_CACHE_DISK_MAX_ENTRIES", 10_000),
+            form_batch_max_items=_env_int("FORM_BATCH_MAX_ITEMS", 100),
+            report_output_dir=os.getenv("REPORT_OUTPUT_DIR", "./output"),
+            report_store_max_bytes=_env_int("REPORT_STORE_MAX_BYTES", 512 * 1024 * 1024),
+            report_chart_dpi=_env_int("REPORT_CHART_DPI", 100),
+            report_chart_scale=_env_float("REPORT_CHART_SCALE", 1.0),
+            report_render_workers=_env_int("REPORT_RENDER_WORKERS", min(4, os.cpu_count() or 1)),
+            report_render_parallel_threshold=_env_int("REPORT_RENDER_PARALLEL_THRESHOLD", 4),
+            report_job_workers=_env_int("REPORT_JOB_WORKERS", 4),
+            report_job_queue_size=_env_int("REPORT_JOB_QUEUE_SIZE", 100),
+            report_job_ttl=_env_float("REPORT_JOB_TTL", 3600),
+            analysis_context_tokens=_env_int("ANALYSIS_CONTEXT_TOKENS", 6000),
+            analysis_batch_tokens=_env_int("ANALYSIS_BATCH_TOKENS", 3000),
+            analysis_partial_max_tokens=_env_int("ANALYSIS_PARTIAL_MAX_TOKENS", 300),
+            analysis_map_concurrency=_env_int("ANALYSIS_MAP_CONCURRENCY", 8),
+            analysis_map_reduce=os.getenv("ANALYSIS_MAP_REDUCE", "").lower() in ("1", "true", "yes"),
+            aggregate_max_distinct_values=_env_int("AGGREGATE_MAX_DISTINCT_VALUES", 50_000),
+            aggregate_max_terms=_env_int("AGGREGATE_MAX_TERMS", 20_000),
+            upload_batch_rows=_env_int("UPLOAD_BATCH_ROWS", 1000),
+            upload_max_line_bytes=_env_int("UPLOAD_MAX_LINE_BYTES", 1024 * 1024),
+            survey_store_path=os.getenv("SURVEY_STORE_PATH", "./data/surveys.sqlite3"),
+            survey_artifact_cache_size=_env_int("SURVEY_ARTIFACT_CACHE_SIZE", 64),
+            survey_artifact_ttl=_env_float("SURVEY_ARTIFACT_TTL", 3600),
+            text_ngram_max=_env_int("TEXT_NGRAM_MAX", 1),
+            text_extra_stopwords=os.getenv("TEXT_EXTRA_STOPWORDS", ""),
+            text_term_cache_size=_env_int("TEXT_TERM_CACHE_SIZE", 256),
+            text_term_cache_ttl=_env_float("TEXT_TERM_CACHE_TTL", 3600),
+            metrics_timing_header=os.getenv("METRICS_TIMING_HEADER", "").lower() in ("1", "true", "yes"),
+            chat_chunk_size=_env_int("CHAT_CHUNK_SIZE", 500),
+            chat_context_token_budget=_env_int("CHAT_CONTEXT_TOKEN_BUDGET", 3000),
+            chat_context_top_k=_env_int("CHAT_CONTEXT_TOP_K", 20),
+            chat_index_cache_size=_env_int("CHAT_INDEX_CACHE_SIZE", 64),
+            chat_index_cache_ttl=_env_float("CHAT_INDEX_CACHE_TTL", 3600),
+            chat_answer_cache_size=_env_int("CHAT_ANSWER_CACHE_SIZE", 512),
+            chat_answer_cache_ttl=_env_float("CHAT_ANSWER_CACHE_TTL", 900),
+        )
+
+
+settings = Settings.from_env()
@@ -1,153 +1,83 @@
-import json
+import asyncio
 import os
-import openai
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
-from collections import Counter
-from docx import Document
-from docx.shared import Inches
-from dotenv import load_dotenv  # For loading the API key from environment variables
-
-# Load OpenAI API key from .env
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# Function to load survey data from JSON
-def load_survey_data(json_data):
-    try:
-        survey_data = json.loads(json_data)
-        return survey_data
-    except json.JSONDecodeError as e:
-        print("Error loading JSON:", e)
-        return None
-
-# Function to dynamically identify closed-ended questions and analyze responses
-def analyze_closed_end_questions(survey_data, doc):
-    closed_end_questions = {}
-    
-    # Iterate over questions and their answers
-    for question in survey_data['questions']:
-        question_text = question['question']
-        question_type = question.get('questionType', '').lower()  # Get question type (e.g., MCQ, True/False)
-        answers = question.get('answers', [])  # Get answers or default to an empty list
-        
-        # Process answers for closed-ended questions
-        for answer in answers:
-            if isinstance(answer, list):  # Ensure answer is a list
-                for a in answer:
-                    a_lower = a.lower()
-                    
-                    # Handle Yes/No questions
-                    if a_lower in ['yes', 'no']:
-                        if question_text not in closed_end_questions:
-                            closed_end_questions[question_text] = {'type': 'yes_no', 'Yes': 0, 'No': 0}
-                        if a_lower == 'yes':
-                            closed_end_questions[question_text]['Yes'] += 1
-                        elif a_lower == 'no':
-                            closed_end_questions[question_text]['No'] += 1
-                    
-                    # Handle True/False questions
-                    elif a_lower in ['true', 'false']:
-                        if question_text not in closed_end_questions:
-                            closed_end_questions[question_text] = {'type': 'true_false', 'True': 0, 'False': 0}
-                        if a_lower == 'true':
-                            closed_end_questions[question_text]['True'] += 1
-                        elif a_lower == 'false':
-                            closed_end_questions[question_text]['False'] += 1
-                    
-                    # Handle MCQ questions
-                    elif question_type == 'mcq':
-                        if question_text not in closed_end_questions:
-                            closed_end_questions[question_text] = {'type': 'mcq'}
-                        if a_lower not in closed_end_questions[question_text]:
-                            closed_end_questions[question_text][a_lower] = 0
-                        closed_end_questions[question_text][a_lower] += 1
-
-    # Generate charts for closed-ended questions
-    for i, (question, data) in enumerate(closed_end_questions.items()):
-        chart_filename = f"chart_{i}.png"
-        
-        if data['type'] == 'yes_no' or data['type'] == 'true_false':
-            # Pie chart for Yes/No and True/False questions
-            labels = list(data.keys())[1:]  # Exclude 'type' key
-            sizes = list(data.values())[1:]  # Exclude 'type' value
-            
-            plt.figure(figsize=(6,6))
-            plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, colors=plt.cm.Paired.colors)
-            plt.title(f"Response Distribution - {question}")
-            plt.savefig(chart_filename)
-            plt.close()
-        
-        elif data['type'] == 'mcq':
-            # Bar chart for MCQ questions
-            labels = list(data.keys())[1:]  # Exclude 'type' key
-            counts = list(data.values())[1:]  # Exclude 'type' value
-            
-            plt.figure(figsize=(8,6))
-            plt.bar(labels, counts, color=plt.cm.Paired.colors)
-            plt.title(f"Response Distribution - {question}")
-            plt.xlabel("Options")
-            plt.ylabel("Count")
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            plt.savefig(chart_filename)
-            plt.close()
+import threading
+from io import BytesIO
+from contextlib import contextmanager
+from app.models.aggregation import aggregate_survey, survey_fields
+from app.models.llm_client import chat_completion
+from app.models.metrics import span
+from app.models.prompt_encoding import encode_survey, encode_survey_chunks
+from app.models.report_formats import ANALYZED_FORMATS, SURVEY_FIELDS, render_report
+from app.models.retrieval import estimate_tokens
+from app.models.settings import settings
+from app.models.text_analytics import survey_term_counts, top_terms
+
+# Prompt tokens spent on survey data; larger surveys are sampled (or map-reduced, if enabled)
+ANALYSIS_CONTEXT_TOKENS = settings.analysis_context_tokens
+ANALYSIS_MAP_REDUCE = settings.analysis_map_reduce
+ANALYSIS_BATCH_TOKENS = settings.analysis_batch_tokens
+ANALYSIS_PARTIAL_MAX_TOKENS = settings.analysis_partial_max_tokens
+ANALYSIS_MAP_CONCURRENCY = settings.analysis_map_concurrency
+
+# Function to chart the closed-ended questions identified by the aggregation engine
+def analyze_closed_end_questions(aggregate, doc):
+    # python-docx and matplotlib are only loaded for docx reports; other formats never need them
+    from docx.shared import Inches
+    from app.models.chart_renderer import render_charts, render_profile
+
+    closed_end_questions = [q for q in aggregate.closed_questions() if q.counts.sum() > 0]
 
+    # Render every chart in memory (in parallel for larger forms), then add them in question order
+    profile = render_profile()
+    specs = [
+        {
+            "question": q.question,
+            "type": q.kind,
+            "labels": q.labels,
+            "counts": q.counts.tolist(),
+            "profile": profile,
+        }
+        for q in closed_end_questions
+    ]
+    charts = render_charts(specs)
+
+    for q, chart_png in zip(closed_end_questions, charts):
         # Add the chart to the Word document
-        doc.add_paragraph(f"Question: {question}")
-        doc.add_picture(chart_filename, width=Inches(4.0))
+        doc.add_paragraph(f"Question: {q.question}")
+        doc.add_paragraph(
+            f"Response rate: {aggregate.response_rate(q):.1%} ({q.answered} of {aggregate.respondent_count})"
+        )
+        doc.add_picture(BytesIO(chart_png), width=Inches(4.0))
         doc.add_paragraph("\n")
-        
-        os.remove(chart_filename)
 
-def generate_wordcloud_for_open_end(survey_data, doc):
-    open_end_answers = []
+def generate_wordcloud_for_open_end(aggregate, doc):
+    from docx.shared import Inches
+    from app.models.chart_renderer import render_wordcloud
 
-    # Iterate over questions and their answers
-    for question in survey_data['questions']:
-        answers = question.get('answers', [])  # Get answers or default to an empty list
-        
-        # Process answers for open-ended questions
-        for answer in answers:
-            if isinstance(answer, list):  # Ensure answer is a list
-                for a in answer:
-                    if a.lower() not in ['yes', 'no']:  # Exclude closed-ended answers
-                        open_end_answers.append(a)
+    # Only open-ended questions contribute, tokenized without punctuation or stopwords
+    word_counts = survey_term_counts(aggregate)
 
     # Generate word cloud for open-ended answers
-    if open_end_answers:
-        word_counts = Counter(" ".join(open_end_answers).split())
+    if word_counts:
         most_common_words = dict(word_counts.most_common(10))
         
-        wordcloud = WordCloud(width=800, height=400, background_color='white').generate_from_frequencies(most_common_words)
-        wordcloud_filename = "wordcloud.png"
-        wordcloud.to_file(wordcloud_filename)
+        wordcloud_png = render_wordcloud(most_common_words)
 
         doc.add_paragraph("Top 10 Most Common Words in Open-Ended Questions")
-        doc.add_picture(wordcloud_filename, width=Inches(4.0))
+        doc.add_picture(BytesIO(wordcloud_png), width=Inches(4.0))
+        for q in aggregate.questions:
+            terms = top_terms(q, 10)
+            if terms:
+                doc.add_paragraph(f"Top terms for \"{q.question}\": " + ", ".join(f"{term} ({count})" for term, count in terms))
         doc.add_paragraph("\n")
 
-        os.remove(wordcloud_filename)
-
-def generate_analysis_with_gpt(survey_data):
+def _analysis_prompt(survey_data, survey_responses):
     goal = survey_data['goal']
     hypothesis = survey_data['hypothesis']
     target_group = survey_data['targetGroup']
     time_taken = survey_data['timeTaken']
-    
-    formatted_responses = []
-    
-    # Iterate over questions and their answers
-    for question in survey_data['questions']:
-        question_text = question['question']
-        answers = question.get('answers', [])  # Get answers or default to an empty list
-        
-        if answers:
-            formatted_responses.append(f"Question: {question_text}")
-            for answer in answers:
-                formatted_responses.append(f"- Answer: {answer}")
 
-    analyze_prompt = f"""
+    return f"""
     You are a skilled data analyst tasked with analyzing survey responses containing both closed and open-ended questions. Your main goal is to deliver a structured and data-driven analysis with proper charts and thematic analysis.
 
     ### Research Details:
@@ -155,7 +85,7 @@ def generate_analysis_with_gpt(survey_data):
     - *Hypothesis:* {hypothesis}
     - *Target Group:* {target_group}
     - *Time Taken (in minutes):* {time_taken}
-    - *Survey Responses:* {', '.join(formatted_responses)}
+    - *Survey Responses:* {survey_responses}
 
     ### Expected Output:
     1. Provide a summary of the survey results.
@@ -163,17 +93,121 @@ def generate_analysis_with_gpt(survey_data):
     3. Perform thematic analysis for open-ended questions.
     4. Evaluate the hypothesis based on the data determine if the hypothesis is: *Supported* or *Partially Supported* or *Not Supported*
     """
+
+def _group_texts(texts, batch_tokens):
+    groups = []
+    current = []
+    used = 0
+    for text in texts:
+        cost = estimate_tokens(text)
+        if current and used + cost > batch_tokens:
+            groups.append(current)
+            current = []
+            used = 0
+        current.append(text)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
+
+async def _summarize_batches(survey_data, batches, instructions):
+    # Partial summaries run concurrently, bounded by both this limit and the shared client's
+    limiter = asyncio.Semaphore(ANALYSIS_MAP_CONCURRENCY)
+
+    async def summarize(batch):
+        prompt = f"""
+    You are a skilled data analyst summarizing one part of a larger survey.
+
+    ### Research Details:
+    - *Goal:* {survey_data['goal']}
+    - *Hypothesis:* {survey_data['hypothesis']}
+
+    ### Task:
+    {instructions}
+
+    ### Data:
+    {batch}
+    """
+        async with limiter:
+            response = await chat_completion(
+                prompt,
+                model="gpt-4",
+                max_tokens=ANALYSIS_PARTIAL_MAX_TOKENS,
+                temperature=0.3
+            )
+        return response.choices[0].message.content
+
+    return await asyncio.gather(*(summarize(batch) for batch in batches))
+
+async def _map_reduce_responses(survey_data, aggregate):
+    """
+    Summarizes response batches concurrently, then merges the partial summaries level by
+    level until they fit in a single analysis prompt.
+    """
+    summaries = await _summarize_batches(
+        survey_data,
+        encode_survey_chunks(aggregate, ANALYSIS_BATCH_TOKENS),
+        "Summarize these responses. Counts of identical answers are given as (xN). For "
+        "closed-ended answers give counts per option; for open-ended answers list the main "
+        "themes with approximate frequencies. Keep the question text. Be concise and do not "
+        "evaluate the hypothesis yet."
+    )
+    while sum(estimate_tokens(summary) for summary in summaries) > ANALYSIS_CONTEXT_TOKENS and len(summaries) > 1:
+        groups = _group_texts(summaries, ANALYSIS_BATCH_TOKENS)
+        if len(groups) == len(summaries):
+            break  # Summaries are individually too large to merge further
+        summaries = await _summarize_batches(
+            survey_data,
+            ["\n\n".join(group) for group in groups],
+            "Merge these partial survey summaries into one, adding up counts for the same "
+            "question and combining themes. Be concise and do not evaluate the hypothesis yet."
+        )
+    return "\n\n".join(summaries)
+
+async def generate_analysis_with_gpt(survey_data, aggregate):
+    # Closed-ended answers become option-count tables and identical open-ended answers are
+    # listed once with their count, which keeps large surveys within one prompt
+    encoded = encode_survey(aggregate)
+    if estimate_tokens(encoded) <= ANALYSIS_CONTEXT_TOKENS:
+        survey_responses = "Counts of identical answers are given as (xN).\n" + encoded
+    elif ANALYSIS_MAP_REDUCE:
+        # Full coverage of the long tail, at the cost of one upstream call per batch
+        survey_responses = "Summarized in batches:\n" + await _map_reduce_responses(survey_data, aggregate)
+    else:
+        # Otherwise the open-ended long tail is sampled to fit the budget
+        survey_responses = (
+            "Counts of identical answers are given as (xN); long answer lists are a stratified sample.\n"
+            + encode_survey(aggregate, ANALYSIS_CONTEXT_TOKENS)
+        )
+
+    analyze_prompt = _analysis_prompt(survey_data, survey_responses)
     
-    response = openai.chat.completions.create(
+    response = await chat_completion(
+        analyze_prompt,
         model="gpt-4",
-        messages=[{"role": "user", "content": analyze_prompt}],
         max_tokens=700,
         temperature=0.5
     )
     
     return response.choices[0].message.content
 
-def create_word_document(survey_data, gpt_analysis, output_path):
+@contextmanager
+def _stage(progress, stage):
+    # Report the stage to the caller (e.g. job status) and time it as a tracing span
+    if progress is not None:
+        progress(stage)
+    with span(f"report.{stage}"):
+        yield
+
+def _save_atomically(output_filename, save):
+    # Write to a temporary file first so a concurrent reader never sees a partial report
+    tmp_filename = f"{output_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    save(tmp_filename)
+    os.replace(tmp_filename, output_filename)
+
+def create_word_document(survey_data, aggregate, gpt_analysis, output_path, filename="survey_analysis_report.docx", progress=None):
+    from docx import Document
+
     # Ensure the output directory exists
     if not os.path.exists(output_path):
         os.makedirs(output_path)
@@ -189,17 +223,94 @@ def create_word_document(survey_data, gpt_analysis, output_path):
     doc.add_heading('Analysis:', level=1)
     doc.add_paragraph(gpt_analysis)
     
-    analyze_closed_end_questions(survey_data, doc)
-    generate_wordcloud_for_open_end(survey_data, doc)
+    with _stage(progress, "charts"):
+        analyze_closed_end_questions(aggregate, doc)
+    with _stage(progress, "wordcloud"):
+        generate_wordcloud_for_open_end(aggregate, doc)
     
-    output_filename = os.path.join(output_path, "survey_analysis_report.docx")
-    doc.save(output_filename)
+    with _stage(progress, "document"):
+        output_filename = os.path.join(output_path, filename)
+        _save_atomically(output_filename, doc.save)
     print(f"Analysis saved to {output_filename}")
     
     return output_filename
 
-def run_analysis(json_data, output_path):
-    survey_data = load_survey_data(json_data)
-    if survey_data:
-        gpt_analysis = generate_analysis_with_gpt(survey_data)
-        return create_word_document(survey_data, gpt_analysis, output_path)
\ No newline at end of file
+def create_text_report(output_format, survey_data, aggregate, gpt_analysis, output_path, filename, progress=None):
+    """
+    Writes a JSON, HTML or CSV report. These skip raster charts and docx serialization.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    with _stage(progress, "document"):
+        content = render_report(output_format, survey_data, aggregate, gpt_analysis)
+        output_filename = os.path.join(output_path, filename)
+
+        def save(path):
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(content)
+
+        _save_atomically(output_filename, save)
+    print(f"Analysis saved to {output_filename}")
+
+    return output_filename
+
+async def run_analysis(survey, output_path, filename="survey_analysis_report.docx", progress=None, output_format="docx"):
+    """
+    Builds the survey report.
+
+    Args:
+        survey (FormData): The validated survey; its answers are read in place.
+        output_path (str): Directory the report is written to.
+        filename (str): Report file name.
+        progress (callable, optional): Called with each stage name ('aggregate', 'analysis',
+            'charts', 'wordcloud', 'document') as it starts.
+        output_format (str): 'docx', 'json', 'html' or 'csv'.
+
+    Returns:
+        str: Path of the written report.
+    """
+    survey_data = survey_fields(survey, SURVEY_FIELDS)
+    # One pass over the answers feeds the GPT, chart and word-cloud stages
+    with _stage(progress, "aggregate"):
+        aggregate = await asyncio.to_thread(aggregate_survey, survey)
+    return await run_analysis_from_aggregate(survey_data, aggregate, output_path, filename, progress, output_format)
+
+async def run_form_analysis(form, output_path, filename="survey_analysis_report.docx", progress=None, output_format="docx"):
+    """
+    Builds the report for a survey in the survey store from its form aggregate, including
+    every response appended since the upload.
+
+    Returns:
+        str: Path of the written report.
+    """
+    with _stage(progress, "aggregate"):
+        aggregate = await asyncio.to_thread(form.snapshot)
+    return await run_analysis_from_aggregate(form.survey, aggregate, output_path, filename, progress, output_format)
+
+async def run_analysis_from_aggregate(survey_data, aggregate, output_path, filename="survey_analysis_report.docx", progress=None, output_format="docx"):
+    """
+    Builds the survey report from an already computed aggregate, e.g. one maintained
+    incrementally by the aggregate store.
+
+    Args:
+        survey_data (dict): Survey metadata (goal, hypothesis, targetGroup, timeTaken).
+        aggregate (SurveyAggregate): Per-question counts.
+        output_path (str): Directory the report is written to.
+        filename (str): Report file name.
+        progress (callable, optional): Called with each remaining stage name as it starts.
+        output_format (str): 'docx', 'json', 'html' or 'csv'.
+
+    Returns:
+        str: Path of the written report.
+    """
+    gpt_analysis = None
+    if output_format in ANALYZED_FORMATS:
+        with _stage(progress, "analysis"):
+            gpt_analysis = await generate_analysis_with_gpt(survey_data, aggregate)
+    # Chart and document rendering is CPU-bound; keep it off the event loop
+    if output_format == "docx":
+        return await asyncio.to_thread(
+            create_word_document, survey_data, aggregate, gpt_analysis, output_path, filename, progress
+        )
+    return await asyncio.to_thread(
+        create_text_report, output_format, survey_data, aggregate, gpt_analysis, output_path, filename, progress
+    )
\ No newline at end of file
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.models.result_cache import ResultCache, make_cache_key
+from app.models.settings import settings
+
+# Running counts live in one row per (form, question, value or term), so an update only
+# touches the keys in its batch
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forms (
+    id TEXT PRIMARY KEY,
+    revision TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    content_hash TEXT,
+    schema TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS form_questions (
+    form_id TEXT NOT NULL,
+    question INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    answered INTEGER NOT NULL,
+    distinct_values INTEGER NOT NULL,
+    distinct_terms INTEGER NOT NULL,
+    PRIMARY KEY (form_id, question)
+);
+CREATE TABLE IF NOT EXISTS form_values (
+    form_id TEXT NOT NULL,
+    question INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (form_id, question, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS form_terms (
+    form_id TEXT NOT NULL,
+    question INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (form_id, question, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS form_artifacts (
+    form_id TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (form_id, name)
+);
+"""
+
+FORM_TABLES = ("form_questions", "form_values", "form_terms", "form_artifacts")
+
+
+def survey_content_hash(survey_data, survey_json: str = None) -> str:
+    """
+    Hash of a validated survey model's JSON, which pydantic serializes in one pass (no
+    dict round trip). Identical uploads share derived artifacts and reports.
+    """
+    if survey_json is None:
+        survey_json = survey_data.model_dump_json()
+    return hashlib.sha256(survey_json.encode("utf-8")).hexdigest()
+
+
+class SurveyStore:
+    """
+    SQLite-backed registry of uploaded surveys keyed by form `_id`. Each survey is kept as
+    its form aggregate (see aggregate_store): the form's schema (survey metadata and
+    questions) plus running counts per question, which new responses are added to. Derived
+    artifacts (retrieval indexes) are cached alongside it.
+
+    Every stored state has its own random revision; artifacts are tied to it, so any update
+    drops them. Recently used forms and artifacts are also kept in memory. Methods block and
+    are meant to be called through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, memory_entries: int):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._memory = ResultCache(max_entries=memory_entries, ttl=settings.survey_artifact_ttl)
+        self._forms = ResultCache(max_entries=memory_entries, ttl=settings.survey_artifact_ttl)
+
+    def put_form(self, form) -> bool:
+        """
+        Stores (or replaces) a form aggregate. Re-uploading an unchanged survey, with no
+        responses added since, keeps the stored state and therefore its revision and artifacts.
+
+        Returns:
+            bool: False if the stored state was kept.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT content_hash FROM forms WHERE id = ?", (form.form_id,)).fetchone()
+            if row is not None and form.content_hash is not None and row[0] == form.content_hash:
+                return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO forms (id, revision, version, content_hash, schema, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (form.form_id, form.revision, form.version, form.content_hash, json.dumps(form.schema()), time.time()),
+            )
+            for table in FORM_TABLES:
+                self._conn.execute(f"DELETE FROM {table} WHERE form_id = ?", (form.form_id,))
+            for question, (rows, answered, values, terms) in form.counts().items():
+                self._conn.execute(
+                    "INSERT INTO form_questions (form_id, question, row_count, answered, distinct_values, distinct_terms) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (form.form_id, question, rows, answered, len(values), len(terms)),
+                )
+                for table, counts in (("form_values", values), ("form_terms", terms)):
+                    self._conn.executemany(
+                        f"INSERT INTO {table} (form_id, question, key, count) VALUES (?, ?, ?, ?)",
+                        ((form.form_id, question, key, count) for key, count in counts.items()),
+                    )
+        self._forms.set(form.form_id, form)
+        return True
+
+    def load_form(self, form_id: str, restore):
+        """
+        Returns the current aggregate of a form, or None. The returned object is never
+        modified afterwards (updates write new counts and a new revision), so it can be read
+        without locking. A copy kept in memory is only used while its revision matches the
+        database.
+
+        Args:
+            form_id (str): The form `_id`.
+            restore (callable): Builds the form from a record with its `form_id`,
+                `revision`, `version`, `content_hash`, `updated_at`, `schema`, and per
+                question index its `questions` (rows, answered), `values` and `terms` counts.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT revision FROM forms WHERE id = ?", (form_id,)).fetchone()
+        if row is None:
+            return None
+        form = self._forms.get(form_id)
+        if form is not None and form.revision == row[0]:
+            return form
+
+        with self._lock:
+            self._conn.execute("BEGIN")  # One read transaction, so the counts match the revision
+            try:
+                row = self._conn.execute(
+                    "SELECT revision, version, content_hash, schema, updated_at FROM forms WHERE id = ?", (form_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                record = {
+                    "form_id": form_id,
+                    "revision": row[0],
+                    "version": row[1],
+                    "content_hash": row[2],
+                    "schema": json.loads(row[3]),
+                    "updated_at": row[4],
+                    "questions": {
+                        question: (rows, answered)
+                        for question, rows, answered in self._conn.execute(
+                            "SELECT question, row_count, answered FROM form_questions WHERE form_id = ?", (form_id,)
+                        )
+                    },
+                }
+                for table, name in (("form_values", "values"), ("form_terms", "terms")):
+                    record[name] = {}
+                    for question, key, count in self._conn.execute(
+                        f"SELECT question, key, count FROM {table} WHERE form_id = ?", (form_id,)
+                    ):
+                        record[name].setdefault(question, {})[key] = count
+            finally:
+                self._conn.commit()
+        form = restore(record)
+        self._forms.set(form_id, form)
+        return form
+
+    def _add_counts(self, table: str, form_id: str, question: int, counts: dict, distinct: int, cap: int) -> int:
+        """
+        Adds `counts` to a question's keys in `table`. Once the question has more than `cap`
+        keys, only the most frequent 80% of `cap` are kept (as `prune_counter` does).
+
+        Returns:
+            int: The question's new number of keys.
+        """
+        if not counts:
+            return distinct
+        distinct += self._conn.executemany(
+            f"INSERT OR IGNORE INTO {table} (form_id, question, key, count) VALUES (?, ?, ?, 0)",
+            ((form_id, question, key) for key in counts),
+        ).rowcount
+        self._conn.executemany(
+            f"UPDATE {table} SET count = count + ? WHERE form_id = ? AND question = ? AND key = ?",
+            ((count, form_id, question, key) for key, count in counts.items()),
+        )
+        if distinct > cap:
+            keep = int(cap * 0.8)
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE form_id = ? AND question = ? AND key NOT IN "
+                f"(SELECT key FROM {table} WHERE form_id = ? AND question = ? ORDER BY count DESC LIMIT ?)",
+                (form_id, question, form_id, question, keep),
+            )
+            distinct = keep
+        return distinct
+
+    def update_form(self, form_id: str, batch_counts):
+        """
+        Adds a batch of counts to a stored form in one transaction, so concurrent updates
+        from any worker process are serialized. Only the rows of the questions, values and
+        terms in the batch are written.
+
+        Args:
+            form_id (str): The form `_id`.
+            batch_counts (callable): Takes the form's schema and returns question index ->
+                (rows, answered, value counts, term counts); if it raises, nothing is saved.
+
+        Returns:
+            dict: The form's new status (form_id, version, respondents), or None if the
+            form does not exist.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # Take the write lock before reading
+            try:
+                row = self._conn.execute("SELECT schema FROM forms WHERE id = ?", (form_id,)).fetchone()
+                if row is None:
+                    self._conn.rollback()
+                    return None
+                for question, (rows, answered, values, terms) in batch_counts(json.loads(row[0])).items():
+                    distinct_values, distinct_terms = self._conn.execute(
+                        "SELECT distinct_values, distinct_terms FROM form_questions WHERE form_id = ? AND question = ?",
+                        (form_id, question),
+                    ).fetchone()
+                    distinct_values = self._add_counts(
+                        "form_values", form_id, question, values, distinct_values, settings.aggregate_max_distinct_values
+                    )
+                    distinct_terms = self._add_counts(
+                        "form_terms", form_id, question, terms, distinct_terms, settings.aggregate_max_terms
+                    )
+                    self._conn.execute(
+                        "UPDATE form_questions SET row_count = row_count + ?, answered = answered + ?, "
+                        "distinct_values = ?, distinct_terms = ? WHERE form_id = ? AND question = ?",
+                        (rows, answered, distinct_values, distinct_terms, form_id, question),
+                    )
+                self._conn.execute(
+                    "UPDATE forms SET revision = ?, version = version + 1, content_hash = NULL, updated_at = ? WHERE id = ?",
+                    (uuid.uuid4().hex, time.time(), form_id),
+                )
+                version = self._conn.execute("SELECT version FROM forms WHERE id = ?", (form_id,)).fetchone()[0]
+                respondents = self._conn.execute(
+                    "SELECT COALESCE(MAX(row_count), 0) FROM form_questions WHERE form_id = ?", (form_id,)
+                ).fetchone()[0]
+                self._conn.execute("DELETE FROM form_artifacts WHERE form_id = ?", (form_id,))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return {"form_id": form_id, "version": version, "respondents": respondents}
+
+    def delete(self, form_id: str) -> bool:
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM forms WHERE id = ?", (form_id,)).rowcount
+            for table in FORM_TABLES:
+                self._conn.execute(f"DELETE FROM {table} WHERE form_id = ?", (form_id,))
+        self._forms.invalidate(form_id)
+        return bool(deleted)
+
+    def artifact(self, form_id: str, revision: str, name: str, build):
+        """
+        Returns the derived artifact `name` for a form state, building and persisting it
+        on first use.
+
+        Args:
+            form_id (str): The survey's form `_id`.
+            revision (str): The form state (`FormAggregate.revision`) it belongs to.
+            name (str): Artifact name, e.g. 'chat_index:500'.
+            build (callable): Zero-argument function returning the artifact.
+
+        Returns:
+            The artifact, or None if the form no longer exists in that state.
+        """
+        memory_key = make_cache_key(form_id, revision, name)
+        value = self._memory.get(memory_key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM form_artifacts WHERE form_id = ? AND name = ? AND revision = ?",
+                (form_id, name, revision),
+            ).fetchone()
+        if row is not None:
+            value = pickle.loads(row[0])
+        else:
+            with self._lock:
+                current = self._conn.execute("SELECT revision FROM forms WHERE id = ?", (form_id,)).fetchone()
+            if current is None or current[0] != revision:
+                return None
+            value = build()
+            with self._lock, self._conn:
+                # Only attach it if the form was not updated while building
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO form_artifacts (form_id, revision, name, value) "
+                    "SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM forms WHERE id = ? AND revision = ?)",
+                    (form_id, revision, name, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), form_id, revision),
+                )
+        self._memory.set(memory_key, value)
+        return value
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_survey_store = None
+
+
+def get_survey_store() -> SurveyStore:
+    # Opened on first use so importing the app does not create the database file
+    global _survey_store
+    if _survey_store is None:
+        _survey_store = SurveyStore(settings.survey_store_path, settings.survey_artifact_cache_size)
+    return _survey_store
+
+
+def close_survey_store():
+    """
+    Closes the database connection, if it was opened; called on application shutdown.
+    """
+    global _survey_store
+    if _survey_store is not None:
+        _survey_store.close()
+        _survey_store = None
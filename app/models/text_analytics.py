@@ -0,0 +1,131 @@
+import re
+from collections import Counter
+
+from app.models.result_cache import ResultCache, make_cache_key
+from app.models.settings import settings
+
+# Bump whenever tokenization changes so cached term frequencies are recomputed
+TEXT_ANALYTICS_VERSION = "1"
+
+NGRAM_MAX = settings.text_ngram_max
+MAX_TERMS = settings.aggregate_max_terms
+
+# Lowercased words, keeping inner apostrophes ("don't") and dropping other punctuation
+_WORD_PATTERN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before
+being below between both but by can could did do does doing don't down during each few for
+from further had has have having he her here hers herself him himself his how i i'm if in
+into is it it's its itself just let's me more most my myself no nor not now of off on once
+only or other our ours ourselves out over own really same she should so some such than that
+that's the their theirs them themselves then there these they they're this those through to
+too under until up us very was we we're were what when where which while who whom why will
+with would yes you you're your yours yourself yourselves
+""".split()) | frozenset(word.strip().lower() for word in settings.text_extra_stopwords.split(",") if word.strip())
+
+_TERMS_CONFIG_KEY = make_cache_key(TEXT_ANALYTICS_VERSION, NGRAM_MAX, sorted(STOPWORDS))
+
+# Term frequencies per open-ended question, keyed by the question's distinct answers and counts
+term_cache = ResultCache(
+    max_entries=settings.text_term_cache_size,
+    ttl=settings.text_term_cache_ttl,
+)
+
+
+def prune_counter(counter: Counter, cap: int):
+    """
+    Keeps memory bounded on huge corpora: once `counter` exceeds `cap` keys, only the most
+    frequent 80% of `cap` are kept.
+    """
+    if len(counter) > cap:
+        keep = counter.most_common(int(cap * 0.8))
+        counter.clear()
+        counter.update(dict(keep))
+
+
+def iter_terms(text: str, ngram_max: int = NGRAM_MAX, stopwords=STOPWORDS):
+    """
+    Yields the terms of one answer: lowercased words without punctuation or stopwords,
+    followed by n-grams (up to `ngram_max` words) of consecutive remaining words.
+    """
+    if ngram_max <= 1:
+        for match in _WORD_PATTERN.finditer(text.lower()):
+            word = match.group()
+            if word not in stopwords:
+                yield word
+        return
+    window = []
+    for match in _WORD_PATTERN.finditer(text.lower()):
+        word = match.group()
+        if word in stopwords:
+            window.clear()  # N-grams do not span stopwords
+            continue
+        window.append(word)
+        if len(window) > ngram_max:
+            window.pop(0)
+        for n in range(1, len(window) + 1):
+            yield " ".join(window[-n:])
+
+
+class TermCounter:
+    """
+    Streaming term-frequency counter: answers are added one at a time (with a repeat count),
+    and the vocabulary is pruned to `max_terms` as it grows.
+    """
+
+    def __init__(self, max_terms: int = MAX_TERMS, ngram_max: int = NGRAM_MAX):
+        self.max_terms = max_terms
+        self.ngram_max = ngram_max
+        self.counts = Counter()
+
+    def add(self, text: str, count: int = 1):
+        counts = self.counts
+        for term in iter_terms(text, self.ngram_max):
+            counts[term] += count
+        # Pruning keeps 80% of the cap, so this runs once per ~20% growth, not per answer
+        if len(counts) > self.max_terms:
+            prune_counter(counts, self.max_terms)
+
+    def most_common(self, n: int = None):
+        return self.counts.most_common(n)
+
+
+def question_term_counts(q) -> dict:
+    """
+    Term frequencies of an open-ended question, computed once per distinct answer and
+    weighted by how often it occurs. Results are cached by content and kept on the
+    aggregate, so repeat reports and later stages skip the work.
+    """
+    if q.term_counts is not None:
+        return q.term_counts
+    if q.is_closed:
+        return {}
+    key = make_cache_key(_TERMS_CONFIG_KEY, q.values, q.value_counts.tolist())
+    term_counts = term_cache.get(key)
+    if term_counts is None:
+        counter = TermCounter()
+        for value, count in zip(q.values, q.value_counts.tolist()):
+            counter.add(value, count)
+        term_counts = dict(counter.counts)
+        term_cache.set(key, term_counts)
+    q.term_counts = term_counts
+    return term_counts
+
+
+def top_terms(q, n: int = 10):
+    """
+    The `n` most frequent terms of an open-ended question as (term, count) pairs.
+    """
+    return Counter(question_term_counts(q)).most_common(n)
+
+
+def survey_term_counts(aggregate) -> Counter:
+    """
+    Term frequencies over all open-ended questions of a survey.
+    """
+    total = Counter()
+    for q in aggregate.questions:
+        if not q.is_closed:
+            total.update(question_term_counts(q))
+    return total
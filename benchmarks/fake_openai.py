@@ -0,0 +1,157 @@
+"""
+Local stand-in for the OpenAI chat completions API, for offline benchmarks.
+
+Responses are canned: prompts asking for a research form get a JSON form, everything else
+gets filler analysis text. Latency is modelled as `latency + completion_tokens / token_rate`
+and a fraction of requests fail with HTTP 500 or 429 according to `error_rate`.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8081 --latency 0.5 --token-rate 50 --error-rate 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:8081/v1 OPENAI_API_KEY=sk-fake uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+RESEARCH_FORM = [
+    {"question": "How often do you use AI tools in your daily life?", "type": "MCQ",
+     "options": ["Daily", "Weekly", "Monthly", "Never"]},
+    {"question": "What is the main benefit AI brings to your work?", "type": "OPEN ENDED"},
+    {"question": "Do you trust answers given by AI assistants?", "type": "TRUE FALSE", "options": ["true", "false"]},
+    {"question": "Which AI tool do you use the most?", "type": "MCQ",
+     "options": ["ChatGPT", "Copilot", "Gemini", "Other"]},
+    {"question": "What concerns do you have about AI?", "type": "OPEN ENDED"},
+]
+
+FILLER_WORDS = (
+    "respondents reported frequent use of assistants with broadly positive sentiment while "
+    "concerns centred on privacy accuracy and job impact overall the hypothesis is partially supported"
+).split()
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.2  # Seconds before the first token
+    token_rate: float = 200.0  # Completion tokens per second
+    error_rate: float = 0.0  # Fraction of requests answered with a 500/429
+    completion_tokens: int = 300  # Length of non-form completions (capped by max_tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+
+    def completion_text(prompt: str, max_tokens: int) -> str:
+        if "research form" in prompt:
+            return json.dumps(RESEARCH_FORM, indent=2)
+        words = min(config.completion_tokens, max_tokens)
+        return " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(words))
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        text = completion_text(prompt, body.get("max_tokens") or 700)
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(text)
+
+        await asyncio.sleep(config.latency)
+        if random.random() < config.error_rate:
+            status = random.choice([429, 500])
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}}, status_code=status)
+
+        created = int(time.time())
+        if body.get("stream"):
+            async def chunks():
+                words = text.split(" ")
+                delay = 1 / config.token_rate if config.token_rate else 0
+                for i, word in enumerate(words):
+                    delta = word if i == 0 else " " + word
+                    chunk = {
+                        "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    if delay:
+                        await asyncio.sleep(delay)
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        if config.token_rate:
+            await asyncio.sleep(completion_tokens / config.token_rate)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": created,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return app
+
+
+class FakeOpenAIServer:
+    """
+    Runs the fake API with uvicorn in a background thread.
+    """
+
+    def __init__(self, config: FakeConfig, host: str = "127.0.0.1", port: int = 0):
+        self.app = create_app(config)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def request_count(self) -> int:
+        return self.app.state.requests
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=FakeConfig.latency)
+    parser.add_argument("--token-rate", type=float, default=FakeConfig.token_rate)
+    parser.add_argument("--error-rate", type=float, default=FakeConfig.error_rate)
+    parser.add_argument("--completion-tokens", type=int, default=FakeConfig.completion_tokens)
+    args = parser.parse_args()
+    config = FakeConfig(args.latency, args.token_rate, args.error_rate, args.completion_tokens)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
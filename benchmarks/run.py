@@ -0,0 +1,223 @@
+"""
+Offline benchmark suite for the FastAPI app.
+
+Starts the local fake OpenAI server, points the app at it and drives
+/generate_research_form, /generate_survey_report and /ask_survey_question in-process
+with synthetic FormData. Reports p50/p99 latency, throughput, error count, peak memory
+and, for reports, the time spent in each pipeline stage. No network access is needed.
+
+Each scenario and size runs in its own subprocess, so peak RSS is measured per scenario
+(ru_maxrss is a process-wide high-water mark). --in-process runs everything in one
+process instead, which is faster but makes peak RSS cumulative.
+
+Usage:
+    python benchmarks/run.py --scenarios form,report,chat --sizes 10,1000,100000 \\
+        --requests 10 --concurrency 4 --latency 0.2 --token-rate 200 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_openai import FakeConfig, FakeOpenAIServer  # noqa: E402
+from benchmarks.synthetic import make_form_data, make_researcher_input  # noqa: E402
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss_kb / (1024 * 1024) if sys.platform == "darwin" else rss_kb / 1024
+
+
+async def drive(client, requests, concurrency):
+    """
+    Sends `(method, url, kwargs)` requests with bounded concurrency and times each one.
+    """
+    limiter = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(method, url, kwargs):
+        nonlocal errors
+        async with limiter:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*request) for request in requests))
+    wall = time.perf_counter() - start
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "p50_seconds": percentile(latencies, 50),
+        "p99_seconds": percentile(latencies, 99),
+        "throughput_rps": len(requests) / wall if wall else None,
+    }
+
+
+async def report_stage_times(payload, output_dir):
+    """
+    Runs the report pipeline once outside the HTTP layer and times each stage.
+    """
+    from app.models.dto import FormData
+    from app.models.survey_report import run_analysis
+
+    marks = []
+    survey_data = FormData(**payload)
+    start = time.perf_counter()
+    await run_analysis(survey_data, output_dir, "stage_timing.docx", progress=lambda stage: marks.append((stage, time.perf_counter())))
+    end = time.perf_counter()
+    times = {"total": end - start}
+    for (stage, at), (_, next_at) in zip(marks, marks[1:] + [(None, end)]):
+        times[stage] = next_at - at
+    return times
+
+
+def scenario_request(scenario, size, seed):
+    if scenario == "form":
+        return ("POST", "/generate_research_form", {"json": make_researcher_input(seed)})
+    if scenario == "report":
+        content = json.dumps(make_form_data(size, seed=seed)).encode()
+        return ("POST", "/generate_survey_report", {"content": content, "headers": {"content-type": "application/json"}})
+    if scenario == "chat":
+        payload = {"survey_data": make_form_data(size, seed=seed), "query": "What concerns do respondents have about AI?"}
+        return ("POST", "/ask_survey_question", {"content": json.dumps(payload).encode(), "headers": {"content-type": "application/json"}})
+    raise ValueError(f"Unknown scenario '{scenario}'.")
+
+
+async def warm_up(client, scenario):
+    """
+    Sends one small, unmeasured request so lazily imported modules are loaded before timing.
+    """
+    method, url, kwargs = scenario_request(scenario, 10, seed=999_999)
+    response = await client.request(method, url, **kwargs)
+    await response.aread()
+
+
+async def run_scenario(client, scenario, size, args, output_dir):
+    # Distinct seeds keep the form and report caches cold unless --warm is given
+    bodies = [scenario_request(scenario, size, 0 if args.warm else i + 1) for i in range(args.requests)]
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    result = await drive(client, bodies, args.concurrency)
+    if args.tracemalloc:
+        result["python_heap_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    result["peak_rss_mb"] = peak_rss_mb()
+    if scenario == "report" and not args.skip_stages:
+        result["stage_seconds"] = await report_stage_times(make_form_data(size, seed=10_000), output_dir)
+    return result
+
+
+async def main_async(args):
+    config = FakeConfig(args.latency, args.token_rate, args.error_rate, args.completion_tokens)
+    with FakeOpenAIServer(config) as fake, tempfile.TemporaryDirectory() as output_dir:
+        # Settings are read at import time, so configure the app before importing it
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+        os.environ["REPORT_OUTPUT_DIR"] = output_dir
+        import httpx
+        from app.main import app
+
+        results = []
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for scenario in args.scenarios:
+                    sizes = [0] if scenario == "form" else args.sizes
+                    await warm_up(client, scenario)
+                    for size in sizes:
+                        upstream_before = fake.request_count
+                        result = await run_scenario(client, scenario, size, args, output_dir)
+                        result.update({"scenario": scenario, "answers": size, "upstream_calls": fake.request_count - upstream_before})
+                        results.append(result)
+                        print(json.dumps(result), flush=True)
+        return results
+
+
+def run_isolated(args, scenario, size):
+    """
+    Runs one scenario and size in a fresh interpreter and returns its result.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "result.json")
+        command = [
+            sys.executable, os.path.abspath(__file__), "--in-process",
+            "--scenarios", scenario, "--sizes", str(size),
+            "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+            "--latency", str(args.latency), "--token-rate", str(args.token_rate),
+            "--error-rate", str(args.error_rate), "--completion-tokens", str(args.completion_tokens),
+            "--output", output,
+        ]
+        command += [flag for flag, enabled in (
+            ("--warm", args.warm), ("--tracemalloc", args.tracemalloc), ("--skip-stages", args.skip_stages),
+        ) if enabled]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(output) as f:
+            return json.load(f)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="form,report,chat", type=lambda s: s.split(","))
+    parser.add_argument("--sizes", default="10,1000,100000", type=lambda s: [int(x) for x in s.split(",")],
+                        help="Total answers per synthetic survey (10 to 1000000)")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per scenario and size")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warm", action="store_true", help="Repeat identical payloads so caches are hit")
+    parser.add_argument("--latency", type=float, default=FakeConfig.latency)
+    parser.add_argument("--token-rate", type=float, default=FakeConfig.token_rate)
+    parser.add_argument("--error-rate", type=float, default=FakeConfig.error_rate)
+    parser.add_argument("--completion-tokens", type=int, default=FakeConfig.completion_tokens)
+    parser.add_argument("--tracemalloc", action="store_true", help="Also record the Python heap peak (slower)")
+    parser.add_argument("--skip-stages", action="store_true", help="Skip the per-stage report timing pass")
+    parser.add_argument("--output", help="Write all results as JSON to this file")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run all scenarios in this process; peak RSS is then cumulative")
+    args = parser.parse_args()
+
+    if args.in_process:
+        results = asyncio.run(main_async(args))
+    else:
+        results = []
+        for scenario in args.scenarios:
+            for size in ([0] if scenario == "form" else args.sizes):
+                result = run_isolated(args, scenario, size)
+                results.append(result)
+                print(json.dumps(result), flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    print("\nscenario  answers    p50(s)   p99(s)   rps      errors  rss(MB)")
+    for r in results:
+        print(f"{r['scenario']:<9} {r['answers']:<10} {r['p50_seconds']:<8.3f} {r['p99_seconds']:<8.3f} "
+              f"{r['throughput_rps']:<8.2f} {r['errors']:<7} {r['peak_rss_mb'] or 0:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Startup-time benchmark for the FastAPI app.
+
+Imports `app.main` in fresh interpreters and records the import time, peak resident
+memory and which heavy dependencies were loaded eagerly. Exits non-zero when a budget
+is exceeded, so it can run in CI to catch cold-start regressions.
+
+Usage:
+    python benchmarks/startup.py --runs 5 --max-import-seconds 2.0 --max-rss-mb 120
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported by the endpoints that need them
+HEAVY_MODULES = ["matplotlib", "wordcloud", "docx", "numpy", "langchain", "langchain_openai", "openai", "httpx"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss_kb / (1024 * 1024) if sys.platform == "darwin" else rss_kb / 1024
+except ImportError:  # Windows
+    rss_mb = None
+print(json.dumps({
+    "import_seconds": elapsed,
+    "rss_mb": rss_mb,
+    "heavy_modules": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_once():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float, default=None)
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    parser.add_argument("--allow-heavy", action="store_true", help="Don't fail on eagerly imported heavy modules")
+    parser.add_argument("--output", help="Also write the JSON result to this file")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.runs)]
+    rss_values = [run["rss_mb"] for run in runs if run["rss_mb"] is not None]
+    result = {
+        "runs": args.runs,
+        "import_seconds_median": statistics.median(run["import_seconds"] for run in runs),
+        "import_seconds_max": max(run["import_seconds"] for run in runs),
+        "rss_mb_median": statistics.median(rss_values) if rss_values else None,
+        "heavy_modules": sorted({m for run in runs for m in run["heavy_modules"]}),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = []
+    if args.max_import_seconds is not None and result["import_seconds_median"] > args.max_import_seconds:
+        failures.append(f"import time {result['import_seconds_median']:.3f}s exceeds {args.max_import_seconds}s")
+    if args.max_rss_mb is not None and result["rss_mb_median"] is not None and result["rss_mb_median"] > args.max_rss_mb:
+        failures.append(f"resident memory {result['rss_mb_median']:.1f}MB exceeds {args.max_rss_mb}MB")
+    if result["heavy_modules"] and not args.allow_heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(result['heavy_modules'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Synthetic FormData payloads for benchmarks.
+"""
+import random
+
+OPEN_ENDED_PHRASES = [
+    "it saves me time on repetitive tasks",
+    "I worry about privacy and how my data is used",
+    "the answers are not always accurate",
+    "helps me write and review code faster",
+    "I use it to summarize long documents",
+    "not sure it will replace jobs but it changes them",
+    "great for brainstorming ideas",
+    "too expensive for small teams",
+]
+
+QUESTION_TEMPLATES = [
+    {"question": "Do you use AI tools at work?", "questionType": "MCQ", "options": ["Yes", "No"]},
+    {"question": "AI assistants give trustworthy answers.", "questionType": "TRUE FALSE", "options": ["true", "false"]},
+    {"question": "Which AI tool do you use the most?", "questionType": "MCQ",
+     "options": ["ChatGPT", "Copilot", "Gemini", "Claude", "Other"]},
+    {"question": "What is the main benefit AI brings to your work?", "questionType": "OPEN ENDED", "options": []},
+    {"question": "How often do you use AI tools?", "questionType": "MCQ",
+     "options": ["Daily", "Weekly", "Monthly", "Never"]},
+    {"question": "What concerns do you have about AI?", "questionType": "OPEN ENDED", "options": []},
+]
+
+
+def _answer(rng: random.Random, template: dict):
+    if template["options"]:
+        return [rng.choice(template["options"])]
+    return [rng.choice(OPEN_ENDED_PHRASES)]
+
+
+def make_form_data(total_answers: int, num_questions: int = 6, seed: int = 0) -> dict:
+    """
+    Builds a FormData payload with roughly `total_answers` answers spread over the questions.
+
+    Args:
+        total_answers (int): Total number of answers across all questions.
+        num_questions (int): Number of questions, cycling through the templates.
+        seed (int): Random seed; different seeds give different content hashes.
+
+    Returns:
+        dict: A JSON-serializable FormData payload.
+    """
+    rng = random.Random(seed)
+    respondents = max(1, total_answers // num_questions)
+    questions = []
+    for i in range(num_questions):
+        template = QUESTION_TEMPLATES[i % len(QUESTION_TEMPLATES)]
+        questions.append({
+            "_id": f"q{i}",
+            "question": template["question"] if i < len(QUESTION_TEMPLATES) else f"{template['question']} ({i})",
+            "questionType": template["questionType"],
+            "options": template["options"],
+            "isRequired": True,
+            "answers": [_answer(rng, template) for _ in range(respondents)],
+        })
+    return {
+        "_id": f"form-{seed}-{total_answers}",
+        "title": "Synthetic AI usage survey",
+        "questions": questions,
+        "user": "benchmark",
+        "isPublished": True,
+        "isActive": True,
+        "isGenerated": False,
+        "isResultsShared": False,
+        "goal": "Understand how adults use AI in daily life",
+        "hypothesis": "Most adults trust AI assistants",
+        "targetGroup": "Adults aged 25-40",
+        "timeTaken": "5",
+    }
+
+
+def make_researcher_input(seed: int = 0) -> dict:
+    return {
+        "goal": f"Gather information about using AI in daily life (cohort {seed})",
+        "hypothesis": "Check how many people trust AI",
+        "target_group": "Adults aged 25-40",
+        "time_taken": 5,
+    }
@@ -1,4 +1,6 @@
-from app.models.form_generator import analyze_researcher_input, format_to_json
+import asyncio
+import json
+from app.models.form_generator import analyze_researcher_input
 
 # Example input for the researcher
 researcher_input = {
@@ -9,20 +11,20 @@ researcher_input = {
 }
 
 # Call the analyze_researcher_input function
-response = analyze_researcher_input(
+response = asyncio.run(analyze_researcher_input(
     goal=researcher_input["goal"],
     hypothesis=researcher_input["hypothesis"],
     target_group=researcher_input["target_group"],
     time_taken=researcher_input["time_taken"]
-)
+))
 
 # Format the response to JSON
 if response:
-    formatted_response = format_to_json(response)
-    if formatted_response:
+    try:
+        formatted_response = json.dumps(json.loads(response), indent=4)
         print("Generated Research Form:")
         print(formatted_response)
-    else:
+    except ValueError:
         print("Failed to format the response into JSON.")
 else:
     print("Failed to generate the research form.")
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Settings are read once at import, so point every store at a scratch directory first
+_data_dir = tempfile.mkdtemp(prefix="survey-tests-")
+os.environ.setdefault("SURVEY_STORE_PATH", os.path.join(_data_dir, "surveys.sqlite3"))
+os.environ.setdefault("REPORT_OUTPUT_DIR", os.path.join(_data_dir, "output"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
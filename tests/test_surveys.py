@@ -0,0 +1,47 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def survey(answers):
+    return {
+        "title": "Feedback",
+        "questions": [
+            {"_id": "q1", "question": "Favourite letter?", "questionType": "mcq", "options": ["a", "b"],
+             "isRequired": False, "answers": answers},
+        ],
+        "user": "tester",
+        "isPublished": True,
+        "isActive": True,
+        "isGenerated": True,
+        "isResultsShared": False,
+    }
+
+
+def csv_report(form_id):
+    response = client.post(f"/generate_survey_report?form_id={form_id}&format=csv")
+    assert response.status_code == 200
+    return response.text, response.headers["X-Report-Cache"]
+
+
+def test_reupload_then_append_never_reuses_a_report():
+    assert client.put("/surveys/f1", json=survey([["a"]])).status_code == 200
+    assert client.post("/surveys/f1/responses", json={"answers": {"q1": [["a"], ["a"]]}}).status_code == 200
+    first_report, _ = csv_report("f1")
+    assert ",a,3," in first_report
+
+    # Same upload again, then different responses: the same version number as before
+    assert client.put("/surveys/f1", json=survey([["a"]])).status_code == 200
+    assert client.post("/surveys/f1/responses", json={"answers": {"q1": [["b"], ["b"]]}}).status_code == 200
+    report, cache = csv_report("f1")
+    assert cache == "miss"
+    assert ",a,1," in report and ",b,2," in report
+
+
+def test_unchanged_reupload_keeps_the_report():
+    assert client.put("/surveys/f2", json=survey([["a"], ["b"]])).status_code == 200
+    csv_report("f2")
+    assert client.put("/surveys/f2", json=survey([["a"], ["b"]])).status_code == 200
+    assert csv_report("f2")[1] == "hit"